@@ -5,26 +5,20 @@
 
 __docformat__ = "restructuredtext en"
 
-from base64 import b64encode
-from datetime import datetime, timedelta
-import gzip
-import hmac
+import copy
+from datetime import datetime
+import re
 import socket
-import StringIO
 import sys
-from time import strftime, gmtime, sleep
+import threading
+import time
+import urllib
 import urllib2
 import warnings
 
-# For historic reasons, this module also supports Python 2.4. To make this
-# happen, a few things have to be imported differently, e.g. pycrypto is needed
-# to create URL signatures.
-if sys.version_info[:2] > (2, 4): # pragma: no cover
-    from urllib2 import quote
-    from hashlib import sha256 # pylint: disable-msg=E0611
-else:
-    from urllib import quote
-    from Crypto.Hash import SHA256 as sha256
+# For historic reasons, this module also supports Python 2.4 (see also
+# amazonproduct.signing).
+if sys.version_info[:2] <= (2, 4): # pragma: no cover
 
     # builtin function all() is only available from Python 2.5 onward!
     def all(iterable):
@@ -37,11 +31,29 @@ else:
                 return False
         return True
 
+    # ... and neither is any()
+    def any(iterable):
+        """
+        Returns True if any element of the iterable is true.
+        """
+        for element in iterable:
+            if element:
+                return True
+        return False
+
 from amazonproduct.version import VERSION
+from amazonproduct.batch import Batch
+from amazonproduct.bulk import BulkItemLookup
+from amazonproduct.connection import ConnectionPool, GzipStream
+from amazonproduct.connection import split_timeout
+from amazonproduct.hedging import Hedger
+from amazonproduct.throttle import TokenBucket
+from amazonproduct.workers import Future, TimeoutError
 from amazonproduct.errors import *
 from amazonproduct.utils import load_config, load_class
 from amazonproduct.utils import running_on_gae, REQUIRED_KEYS
 from amazonproduct.processors import ITEMS_PAGINATOR, BaseProcessor
+from amazonproduct.signing import Signer
 
 USER_AGENT = ('python-amazon-product-api/%s '
     '+http://pypi.python.org/pypi/python-amazon-product-api/' % VERSION)
@@ -60,11 +72,14 @@ HOSTS = {
     'us': 'ecs.amazonaws.com',
 }
 
+_OPERATION = re.compile(r'[?&]Operation=([^&]+)')
+
 
 class GZipHandler(urllib2.BaseHandler):
 
     """
-    A handler to deal with gzip encoded content.
+    A handler to deal with gzip encoded content. The response body is inflated
+    while it is being read (see :class:`~amazonproduct.connection.GzipStream`).
     Borrowed from Andrew Rowls
     http://techknack.net/python-urllib2-handlers/
     """
@@ -75,7 +90,7 @@ class GZipHandler(urllib2.BaseHandler):
 
     def http_response(self, req, resp):
         if resp.headers.get('content-encoding') == 'gzip':
-            gz = gzip.GzipFile(fileobj=StringIO.StringIO(resp.read()), mode='r')
+            gz = GzipStream(resp)
             old = resp
             resp = urllib2.addinfourl(gz, old.headers, old.url)
             resp.msg = old.msg
@@ -113,11 +128,20 @@ class API (object):
 
     VERSION = '2011-08-01' #: supported Amazon API version
     REQUESTS_PER_SECOND = 1 #: max requests per second
-    TIMEOUT = 5 #: timeout in seconds
+    BURST = 1 #: max number of requests sent in a row without waiting
+    THROTTLED_RETRIES = 3 #: max retries of throttled requests (see limiter)
+    TIMEOUT = 5 #: read timeout in seconds
+    CONNECT_TIMEOUT = 5 #: connect timeout in seconds
+
+    #: Operations which may be coalesced (see ``coalesce``). Cart operations
+    #: change state and must never be!
+    COALESCED_OPERATIONS = ('ItemLookup', 'ItemSearch', 'SimilarityLookup',
+                            'BrowseNodeLookup')
 
     def __init__(self, access_key_id=None, secret_access_key=None, locale=None,
              associate_tag=None, processor='amazonproduct.processors.objectify',
-             cfg=None):
+             cfg=None, pool=None, limiter=None, coalesce=False, breaker=None,
+             hedge=False, timeout=None):
         """
         .. versionchanged:: 0.2.6
            Passing parameters ``access_key_id``, ``secret_access_key`` and
@@ -130,6 +154,30 @@ class API (object):
         :param locale: localise results by using one value from ``LOCALES``.
         :param processor: module containing result processing functions. Look
         in package ``amazonproduct.processors`` for values.
+        :param pool: :class:`~amazonproduct.connection.ConnectionPool` used to
+        keep connections to Amazon alive between calls. If omitted, each API
+        instance uses its own pool. Pass ``False`` to open a new connection
+        for every request.
+        :param limiter: rate limiter (e.g.
+        :class:`~amazonproduct.throttle.TokenBucket`) which may be shared with
+        other API instances. If omitted, a token bucket allowing
+        :attr:`REQUESTS_PER_SECOND` and :attr:`BURST` is used.
+        :param coalesce: if ``True``, identical read-only calls (see
+        :attr:`COALESCED_OPERATIONS`) made by several threads at the same
+        time are sent to Amazon only once. All callers get (a copy of) the
+        same result or the same error. Not available with processors whose
+        results can be used only once (e.g.
+        :mod:`~amazonproduct.processors.iterparse`).
+        :param breaker: :class:`~amazonproduct.breaker.CircuitBreaker` which
+        makes requests fail immediately while Amazon's endpoint for this
+        locale is in trouble. It may be shared with other API instances.
+        :param hedge: if ``True`` (or a :class:`~amazonproduct.hedging.Hedger`
+        instance), read-only lookups which take unusually long are sent a
+        second time and the faster response is used.
+        :param timeout: seconds to wait for a connection to Amazon and for
+        each read from it as ``(connect, read)`` tuple or a single number for
+        both. Defaults to :attr:`CONNECT_TIMEOUT` and :attr:`TIMEOUT`. Only
+        the sockets used by this API are affected.
         """
 
         if any([access_key_id, secret_access_key, associate_tag]):
@@ -155,8 +203,16 @@ class API (object):
             raise UnknownLocale(locale)
 
         # GAE does not allow timeouts to be specified manually
-        if not running_on_gae():
-            socket.setdefaulttimeout(self.TIMEOUT)
+        if timeout is None:
+            timeout = (self.CONNECT_TIMEOUT, self.TIMEOUT)
+        self.timeout = split_timeout(timeout)
+        if running_on_gae():
+            self.timeout = None
+
+        # GAE does not allow sockets to be kept open either
+        if pool is None and not running_on_gae():
+            pool = ConnectionPool()
+        self.pool = pool or None
 
         # instantiate processor class
         if isinstance(processor, str):
@@ -166,6 +222,20 @@ class API (object):
             self._processor_module = processor.__class__.__name__
             self.processor = processor
 
+        self.limiter = limiter
+        self._limiter_lock = threading.Lock()
+        if coalesce and not getattr(self.processor, 'reusable', True):
+            raise ValueError('Results of %s cannot be shared by coalesced '
+                             'calls!' % self._processor_module)
+        self.coalesce = coalesce
+        self.breaker = breaker
+        if hedge is True:
+            hedge = Hedger()
+        self.hedger = hedge or None
+        self._inflight = {}  # request key -> [future, number of waiters]
+        self._inflight_lock = threading.Lock()
+        self._deadlines = threading.local()
+        self._signer = None  # (host/credentials/version, signer)
         self.last_call = datetime(1970, 1, 1)
         self.debug = 0  # set to 1 if you want to see HTTP headers
 
@@ -178,67 +248,176 @@ class API (object):
         Builds a signed URL for querying Amazon AWS.  This function is based
         on code by Adam Cox (found at
         http://blog.umlungu.co.uk/blog/2009/jul/12/pyaws-adding-request-authentication/)
-        """
-        # remove empty (=None) parameters
-        for key, val in qargs.items():
-            if val is None:
-                del qargs[key]
-
-        if 'AWSAccessKeyId' not in qargs:
-            qargs['AWSAccessKeyId'] = self.access_key
-
-        if 'Service' not in qargs:
-            qargs['Service'] = 'AWSECommerceService'
-
-        # use the version this class was build for by default
-        if 'Version' not in qargs:
-            qargs['Version'] = self.VERSION
 
-        if 'AssociateTag' not in qargs and self.associate_tag:
-            qargs['AssociateTag'] = self.associate_tag
+        .. versionchanged:: 0.2.9
+           Signing is done by :attr:`signer`.
+        """
+        return self.signer.sign(qargs)
 
-        if isinstance(qargs.get('ResponseGroup'), list):
-            qargs['ResponseGroup'] = ','.join(qargs['ResponseGroup'])
+    def _get_signer(self):
+        """
+        Returns the :class:`~amazonproduct.signing.Signer` for the current
+        host, credentials and :attr:`VERSION` (which may all be changed after
+        initialisation).
+        """
+        key = (self.host, self.access_key, self.secret_key,
+               self.associate_tag, self.VERSION)
+        signer = self._signer
+        if signer is None or signer[0] != key:
+            signer = self._signer = (key, Signer(
+                self.host, self.access_key, self.secret_key, {
+                    'Service': 'AWSECommerceService',
+                    'Version': self.VERSION,
+                    'AssociateTag': self.associate_tag or None,
+                }))
+        return signer[1]
+
+    signer = property(_get_signer, doc="""
+        :class:`~amazonproduct.signing.Signer` creating the signed URLs for
+        this API. Use its :meth:`~amazonproduct.signing.Signer.sign_many` to
+        sign lots of requests at once.
+
+        .. versionadded:: 0.2.9
+        """)
+
+    def _throttle(self):
+        """
+        Be nice and wait for some time before submitting the next request (see
+        :attr:`REQUESTS_PER_SECOND`). This is safe to be called from several
+        threads at once.
+        """
+        if self.limiter is None:
+            # The default limiter is created on first use, so that
+            # REQUESTS_PER_SECOND can still be changed after initialisation.
+            self._limiter_lock.acquire()
+            try:
+                if self.limiter is None:
+                    self.limiter = TokenBucket(
+                        self.REQUESTS_PER_SECOND, self.BURST)
+            finally:
+                self._limiter_lock.release()
+        timeout = self._time_left()
+        if timeout is None:
+            self.limiter.acquire()
+        elif not self.limiter.acquire(timeout):
+            # no point in waiting for a request slot we cannot use anyway
+            raise DeadlineExceeded
+        self.last_call = datetime.now()
 
-        # add timestamp (this is required when using a signature)
-        qargs['Timestamp'] = strftime("%Y-%m-%dT%H:%M:%SZ", gmtime())
+    def _fetch(self, url):
+        """
+        Calls the Amazon Product Advertising API and returns the response.
+        While the circuit breaker (if any) is open for this host,
+        :class:`~amazonproduct.errors.CircuitOpen` is raised right away.
+        """
+        if self.breaker is not None:
+            return self.breaker.call(self.host, self._urlopen, url)
+        return self._urlopen(url)
 
-        # create signature
-        keys = sorted(qargs.keys())
-        args = '&'.join('%s=%s' % (key, quote(unicode(qargs[key])
-                        .encode('utf-8'), safe='~')) for key in keys)
+    def _urlopen(self, url):
+        """
+        Waits for the rate limiter and sends the request for ``url``.
+        Read-only lookups are hedged (see :attr:`hedger`) once they have been
+        sent. The rate limiter is told about each successful response.
+        """
+        self._throttle()
+        match = self.hedger is not None and _OPERATION.search(url)
+        if match and match.group(1) in self.hedger.operations:
+            # a duplicate request is only sent if the rate limiter has a slot
+            # for it right away
+            response = self.hedger.request(self._send_before,
+                (self._deadline(), url), lambda: self.limiter.acquire(0))
+        else:
+            response = self._send(url)
+        self.limiter.success()
+        return response
 
-        msg = 'GET'
-        msg += '\n' + self.host
-        msg += '\n/onca/xml'
-        msg += '\n' + args
+    def _send(self, url):
+        """
+        Sends the request for ``url`` (the rate limiter must have let it
+        through already). Its timeouts are cut short if the deadline of the
+        call is closer.
+        """
+        timeout = self.timeout
+        left = self._time_left()
+        if timeout is not None and left is not None:
+            timeout = tuple(min(seconds, left) for seconds in timeout)
 
-        signature = quote(
-            b64encode(hmac.new(self.secret_key or '', msg, sha256).digest()))
+        try:
+            if self.pool is not None and not self._proxied():
+                return self.pool.urlopen(url, {'User-Agent': USER_AGENT},
+                    debuglevel=self.debug, timeout=timeout)
+
+            request = urllib2.Request(url)
+            request.add_header('User-Agent', USER_AGENT)
+            handler = urllib2.HTTPHandler(debuglevel=self.debug)
+            opener = urllib2.build_opener(handler, GZipHandler())
+            if timeout is None or sys.version_info[:2] < (2, 6):
+                # (urllib2 only accepts a timeout from Python 2.6 onward)
+                return opener.open(request)
+            # urllib2 knows only one timeout for everything
+            return opener.open(request, timeout=max(timeout))
+        except urllib2.URLError, e:
+            reason = getattr(e, 'reason', None)
+            if isinstance(reason, socket.timeout) and timeout != self.timeout:
+                raise DeadlineExceeded
+            raise
 
-        return 'http://%s/onca/xml?%s&Signature=%s' % (
-            self.host, args, signature)
+    def _deadline(self):
+        """
+        Returns the time by which the current call must be finished (or
+        ``None``).
+        """
+        return getattr(self._deadlines, 'until', None)
 
-    def _fetch(self, url):
+    def _time_left(self):
         """
-        Calls the Amazon Product Advertising API and returns the response.
+        Returns the seconds left until the deadline of the current call (or
+        ``None`` if there is none). Raises
+        :class:`~amazonproduct.errors.DeadlineExceeded` once it has passed.
+        """
+        until = self._deadline()
+        if until is None:
+            return None
+        left = until - time.time()
+        if left <= 0:
+            raise DeadlineExceeded
+        return left
+
+    def _call_before(self, until, qargs):
+        """
+        Calls the operation for ``qargs`` which has to be finished by
+        ``until`` (unless an outer call has to be finished even earlier).
         """
-        request = urllib2.Request(url)
-        request.add_header('User-Agent', USER_AGENT)
+        outer = self._deadline()
+        if outer is not None and outer < until:
+            until = outer
+        self._deadlines.until = until
+        try:
+            self._time_left()
+            return self.call(**qargs)
+        finally:
+            self._deadlines.until = outer
 
-        # Be nice and wait for some time
-        # before submitting the next request
-        delta = datetime.now() - self.last_call
-        throttle = timedelta(seconds=1/self.REQUESTS_PER_SECOND)
-        if delta < throttle:
-            wait = throttle-delta
-            sleep(wait.seconds+wait.microseconds/1000000.0) # pragma: no cover
-        self.last_call = datetime.now()
+    def _proxied(self):
+        """
+        Returns ``True`` if requests to :attr:`host` have to go through an
+        HTTP proxy (see :func:`urllib.getproxies`). The connection pool
+        connects directly, so these requests are sent by urllib2 instead.
+        """
+        return ('http' in urllib.getproxies()
+                and not urllib.proxy_bypass(self.host))
 
-        handler = urllib2.HTTPHandler(debuglevel=self.debug)
-        opener = urllib2.build_opener(handler, GZipHandler())
-        response = opener.open(request)
-        return response
+    def _send_before(self, until, url):
+        """
+        Same as :meth:`_send` but for use in other threads which do not know
+        the deadline ``until`` of the current call.
+        """
+        self._deadlines.until = until
+        try:
+            return self._send(url)
+        finally:
+            self._deadlines.until = None
 
     def _reg(self, key):
         """
@@ -258,54 +437,68 @@ class API (object):
         try:
             return self.processor.parse(fp)
         except AWSError, e:
+            error = self._convert_error(e)
+            if error is e:
+                raise
+            raise error
 
-            # simple errors
-
-            errors = {
-                'InternalError': InternalError,
-                'InvalidClientTokenId': InvalidClientTokenId,
-                'MissingClientTokenId': MissingClientTokenId,
-                'RequestThrottled': TooManyRequests,
-                'Deprecated': DeprecatedOperation,
-                'AWS.ECommerceService.NoExactMatches': NoExactMatchesFound,
-                'AccountLimitExceeded': AccountLimitExceeded,
-                'AWS.ECommerceService.ItemNotEligibleForCart': InvalidCartItem,
-                'AWS.ECommerceService.CartInfoMismatch': CartInfoMismatch,
-                'AWS.ParameterOutOfRange': ParameterOutOfRange,  # TODO regexp?
-                'AWS.InvalidAccount': InvalidAccount,
-                'SignatureDoesNotMatch': InvalidSignature,
-            }
-
-            if e.code in errors:
-                raise _e(errors[e.code])
-
-            if e.code == 'AWS.MissingParameters':
-                m = self._reg('missing-parameters').search(e.msg)
-                raise _e(MissingParameters, m.group('parameter'))
-
-            if e.code == 'AWS.InvalidEnumeratedParameter':
-                m = self._reg('invalid-value').search(e.msg)
-                if m is not None:
-                    if m.group('parameter') == 'ResponseGroup':
-                        raise _e(InvalidResponseGroup)
-                    elif m.group('parameter') == 'SearchIndex':
-                        raise _e(InvalidSearchIndex)
-
-            if e.code == 'AWS.InvalidParameterValue':
-                m = self._reg('invalid-parameter-value').search(e.msg)
-                raise _e(InvalidParameterValue,
-                         m.group('parameter'), m.group('value'))
-
-            if e.code == 'AWS.RestrictedParameterValueCombination':
-                m = self._reg('invalid-parameter-combination').search(e.msg)
-                raise _e(InvalidParameterCombination, m.group('message'))
-
-            if e.code == 'AWS.ECommerceService.ItemAlreadyInCart':
-                item = self._reg('already-in-cart').search(e.msg).group('item')
-                raise _e(ItemAlreadyInCart, item)
+    def _convert_error(self, e):
+        """
+        Returns the appropriate (more specific) exception for the generic
+        :class:`~amazonproduct.errors.AWSError` ``e`` or ``e`` itself.
 
-            # otherwise simply re-raise
-            raise
+        .. versionadded:: 0.2.9
+        """
+        # simple errors
+
+        errors = {
+            'InternalError': InternalError,
+            'InvalidClientTokenId': InvalidClientTokenId,
+            'MissingClientTokenId': MissingClientTokenId,
+            'RequestThrottled': TooManyRequests,
+            'Deprecated': DeprecatedOperation,
+            'AWS.ECommerceService.NoExactMatches': NoExactMatchesFound,
+            'AccountLimitExceeded': AccountLimitExceeded,
+            'AWS.ECommerceService.ItemNotEligibleForCart': InvalidCartItem,
+            'AWS.ECommerceService.CartInfoMismatch': CartInfoMismatch,
+            'AWS.ParameterOutOfRange': ParameterOutOfRange,  # TODO regexp?
+            'AWS.InvalidAccount': InvalidAccount,
+            'SignatureDoesNotMatch': InvalidSignature,
+            'AWS.ExceededMaxBatchRequestsPerOperation':
+                ExceededMaxBatchRequestsPerOperation,
+        }
+
+        if e.code in errors:
+            return _e(errors[e.code], error=e)
+
+        if e.code == 'AWS.MissingParameters':
+            m = self._reg('missing-parameters').search(e.msg)
+            return _e(MissingParameters, m.group('parameter'), error=e)
+
+        if e.code == 'AWS.InvalidEnumeratedParameter':
+            m = self._reg('invalid-value').search(e.msg)
+            if m is not None:
+                if m.group('parameter') == 'ResponseGroup':
+                    return _e(InvalidResponseGroup, error=e)
+                elif m.group('parameter') == 'SearchIndex':
+                    return _e(InvalidSearchIndex, error=e)
+
+        if e.code == 'AWS.InvalidParameterValue':
+            m = self._reg('invalid-parameter-value').search(e.msg)
+            return _e(InvalidParameterValue,
+                      m.group('parameter'), m.group('value'), error=e)
+
+        if e.code == 'AWS.RestrictedParameterValueCombination':
+            m = self._reg('invalid-parameter-combination').search(e.msg)
+            return _e(InvalidParameterCombination, m.group('message'),
+                      error=e)
+
+        if e.code == 'AWS.ECommerceService.ItemAlreadyInCart':
+            item = self._reg('already-in-cart').search(e.msg).group('item')
+            return _e(ItemAlreadyInCart, item, error=e)
+
+        # otherwise use the original error
+        return e
 
     def call(self, **qargs):
         """
@@ -319,10 +512,109 @@ class API (object):
         .. note:: If you want to customise things at any stage, simply override the respective method(s):
 
         * ``_build_url(**query_parameters)``
+        * ``_request(url)`` (which uses the following two)
         * ``_fetch(url)``
         * ``_parse(fp)``
+
+        Requests throttled by Amazon are retried transparently (up to
+        :attr:`THROTTLED_RETRIES` times) if the rate limiter asks for it (see
+        :class:`~amazonproduct.throttle.AdaptiveTokenBucket`).
+
+        Pass ``deadline=<seconds>`` to limit the time the whole call may take
+        (including waiting for the rate limiter, retries and the pages of a
+        paginator). :class:`~amazonproduct.errors.DeadlineExceeded` is
+        raised as soon as it is clear that the call cannot be finished in
+        time. This works for all operations, e.g.
+        ``api.item_lookup('0201896834', deadline=2.5)``.
+        """
+        deadline = qargs.pop('deadline', None)
+        if deadline is not None:
+            return self._call_before(time.time() + deadline, qargs)
+
+        if (not self.coalesce
+        or qargs.get('Operation') not in self.COALESCED_OPERATIONS):
+            return self._call(**qargs)
+
+        key = self._request_key(qargs)
+        self._inflight_lock.acquire()
+        try:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = self._inflight[key] = [Future(), 0]
+                leader = True
+            else:
+                inflight[1] += 1
+                leader = False
+        finally:
+            self._inflight_lock.release()
+
+        future = inflight[0]
+        if not leader:
+            try:
+                return copy.deepcopy(future.result(self._time_left()))
+            except TimeoutError:
+                raise DeadlineExceeded
+            except DeadlineExceeded:
+                # the leader ran out of *its* time which says nothing about
+                # ours (raises if ours is up as well)
+                self._time_left()
+                return self.call(**qargs)
+
+        try:
+            result = self._call(**qargs)
+        except:
+            self._finish_inflight(key)
+            future.set_exception(sys.exc_info())
+            raise
+        if self._finish_inflight(key):
+            # the waiting callers copy the original, so it must not be
+            # handed out itself
+            future.set_result(result)
+            return copy.deepcopy(result)
+        future.set_result(result)
+        return result
+
+    def _request_key(self, qargs):
+        """
+        Returns a key identifying the request for ``qargs`` (regardless of
+        when it is sent).
+        """
+        return self.host, tuple(sorted(
+            (key, unicode(val)) for key, val in qargs.items()
+            if val is not None))
+
+    def _finish_inflight(self, key):
+        """
+        Removes the request ``key`` from the requests in flight and returns
+        the number of callers waiting for its result.
+        """
+        self._inflight_lock.acquire()
+        try:
+            return self._inflight.pop(key)[1]
+        finally:
+            self._inflight_lock.release()
+
+    def _call(self, **qargs):
+        """
+        Sends the request for ``qargs`` retrying it if it is throttled.
+        """
+        retries = 0
+        while True:
+            url = self._build_url(**qargs)
+            try:
+                result = self._request(url)
+            except TooManyRequests:
+                retry = self.limiter is not None and self.limiter.throttled()
+                if retry and retries < self.THROTTLED_RETRIES:
+                    retries += 1
+                    continue
+                raise
+            return result
+
+    def _request(self, url):
+        """
+        Fetches the response for a signed URL and parses it.
         """
-        url = self._build_url(**qargs)
         try:
             fp = self._fetch(url)
             return self._parse(fp)
@@ -446,6 +738,42 @@ class API (object):
         except InvalidResponseGroup:
             raise _e(InvalidResponseGroup, params.get('ResponseGroup'))
 
+    def bulk_item_lookup(self, ids, workers=None, **params):
+        """
+        Looks up any number of items (:meth:`item_lookup` is limited to 10
+        ItemIds per call) and returns an iterator over all of them. ``ids``
+        may be any iterable (e.g. a generator). ItemIds which cannot be found
+        are collected in attribute ``missing`` of the returned
+        :class:`~amazonproduct.bulk.BulkItemLookup` instead of raising an
+        error. ::
+
+            >>> lookup = api.bulk_item_lookup(asins, ResponseGroup='Offers')
+            >>> for item in lookup:
+            ...     print item.ASIN
+            >>> print lookup.missing
+
+        :param workers: number of requests sent concurrently (still within
+          the rate limit).
+
+        .. versionadded:: 0.2.9
+        """
+        return BulkItemLookup(self, ids, workers, **params)
+
+    def batch(self):
+        """
+        Returns a :class:`~amazonproduct.batch.Batch` which combines two
+        operations of the same kind into one request to Amazon::
+
+            >>> with api.batch() as batch:
+            ...     first = batch.item_lookup(*asins[:10])
+            ...     second = batch.item_lookup(*asins[10:20])
+            >>> for item in first.result().Item:
+            ...     print item.ASIN
+
+        .. versionadded:: 0.2.9
+        """
+        return Batch(self)
+
     def item_search(self, search_index, paginate=ITEMS_PAGINATOR, **params):
         """
         .. versionchanged:: 2011-08-01
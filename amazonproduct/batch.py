@@ -0,0 +1,195 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Batch requests which combine two requests of the same operation (e.g. two
+ItemLookups with 10 ItemIds each) into one call to Amazon, so that a single
+(throttled) request slot covers twice as much.
+
+http://docs.aws.amazon.com/AWSECommerceService/latest/DG/BatchRequests.html
+"""
+
+import threading
+
+from amazonproduct.errors import AWSError, NoSimilarityForASIN, _e
+from amazonproduct.processors._lxml import compile_xpath
+from amazonproduct.workers import Future
+
+
+class Batch (object):
+
+    """
+    Collects operations and sends them to Amazon in pairs. Each operation
+    returns a :class:`~amazonproduct.workers.Future` whose result is the part
+    of the response belonging to it (e.g. the ``Items`` node) or which raises
+    the error Amazon reported for it. ::
+
+        with api.batch() as batch:
+            first = batch.item_lookup(*asins[:10])
+            second = batch.item_lookup(*asins[10:20])
+        for item in first.result().Item:
+            print item.ASIN
+
+    Two operations of the same type are sent as soon as they have been
+    collected; a single remaining one is sent by :meth:`flush` (which is
+    called when leaving the ``with`` block).
+
+    .. note:: Only processors based on lxml (``objectify`` and ``etree``) are
+       supported.
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Max number of requests per operation Amazon accepts in one batch
+    MAX_REQUESTS = 2
+
+    def __init__(self, api):
+        self.api = api
+        self._pending = {}  # operation -> [(parameters, future), ...]
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s for %r at %s>' % (
+            self.__class__.__name__, self.api, hex(id(self)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def add(self, operation, **params):
+        """
+        Adds a request for ``operation`` with ``params`` and returns a future
+        of its result.
+        """
+        future = Future()
+        self._lock.acquire()
+        try:
+            pending = self._pending.setdefault(operation, [])
+            pending.append((params, future))
+            if len(pending) < self.MAX_REQUESTS:
+                return future
+            del self._pending[operation]
+        finally:
+            self._lock.release()
+        self._send(operation, pending)
+        return future
+
+    def flush(self):
+        """
+        Sends all operations collected so far.
+        """
+        self._lock.acquire()
+        try:
+            pending, self._pending = self._pending, {}
+        finally:
+            self._lock.release()
+        for operation, requests in pending.items():
+            self._send(operation, requests)
+
+    def item_lookup(self, *ids, **params):
+        """
+        Same as :meth:`amazonproduct.api.API.item_lookup` (without
+        pagination).
+        """
+        return self.add('ItemLookup', ItemId=','.join(ids), **params)
+
+    def item_search(self, search_index, **params):
+        """
+        Same as :meth:`amazonproduct.api.API.item_search` (without
+        pagination).
+        """
+        return self.add('ItemSearch', SearchIndex=search_index, **params)
+
+    def similarity_lookup(self, *ids, **params):
+        """
+        Same as :meth:`amazonproduct.api.API.similarity_lookup`.
+        """
+        return self.add('SimilarityLookup', ItemId=','.join(ids), **params)
+
+    def browse_node_lookup(self, browse_node_id, response_group=None,
+                           **params):
+        """
+        Same as :meth:`amazonproduct.api.API.browse_node_lookup`.
+        """
+        return self.add('BrowseNodeLookup', BrowseNodeId=browse_node_id,
+                        ResponseGroup=response_group, **params)
+
+    def _send(self, operation, requests):
+        """
+        Sends ``requests`` (a list of ``(parameters, future)``) for
+        ``operation`` as a single request and hands out the results.
+        """
+        futures = [future for _, future in requests]
+        for future in futures:
+            future.set_running()
+        if len(requests) == 1:
+            params = dict(requests[0][0], Operation=operation)
+        else:
+            params = {'Operation': operation}
+            for no, (args, _) in enumerate(requests):
+                for key, value in args.items():
+                    params['%s.%i.%s' % (operation, no + 1, key)] = value
+        try:
+            try:
+                root = self.api.call(**params)
+            except AWSError, e:
+                # errors of single requests are raised for the whole response
+                if e.xml is None or self._failed(e.xml):
+                    raise
+                root = e.xml
+            results = self._split(root)
+            if len(results) != len(futures):
+                raise AWSError(code='UnexpectedResponse', xml=root,
+                    msg='Expected %i results but got %i!' % (
+                        len(futures), len(results)))
+        except:
+            for future in futures:
+                future.set_exception()
+            return
+        for future, (node, error) in zip(futures, results):
+            if error is not None:
+                future.set_exception((type(error), error, None))
+            else:
+                future.set_result(node)
+
+    def _xpath(self, expr, node):
+        nspace = node.getroottree().getroot().nsmap.get(None, '')
+        return compile_xpath(expr, nspace)(node)
+
+    def _failed(self, root):
+        """
+        Has the request as a whole failed (rather than single operations)?
+        """
+        return bool(self._xpath('/*/aws:Error | /*/*/aws:Errors/aws:Error',
+                                root))
+
+    def _split(self, root):
+        """
+        Returns ``(node, error)`` for each request contained in response
+        ``root``.
+        """
+        results = []
+        for node in self._xpath('/*/*[aws:Request]', root):
+            error = None
+            errors = self._xpath('aws:Request/aws:Errors/aws:Error', node)
+            if errors:
+                error = self._error(AWSError(
+                    code=self._xpath('string(aws:Code)', errors[0]),
+                    msg=self._xpath('string(aws:Message)', errors[0]),
+                    xml=node))
+            results.append((node, error))
+        return results
+
+    def _error(self, error):
+        """
+        Converts a generic error into the same exception the corresponding
+        :class:`~amazonproduct.api.API` operation would raise.
+        """
+        if error.code == 'AWS.ECommerceService.NoSimilarities':
+            asin = self.api._reg('no-similarities').search(error.msg)
+            return _e(NoSimilarityForASIN, asin.group('ASIN'), error=error)
+        return self.api._convert_error(error)
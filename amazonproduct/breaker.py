@@ -0,0 +1,332 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Circuit breakers which stop sending requests to an Amazon endpoint (see
+:data:`amazonproduct.api.HOSTS`) while it is failing, so that callers fail
+immediately rather than waiting for one timeout after another.
+"""
+
+import collections
+import httplib
+import re
+import socket
+import StringIO
+import sys
+import threading
+import time
+import urllib2
+
+from amazonproduct.errors import CircuitOpen, DeadlineExceeded
+
+#: States of a circuit
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+# outcomes of a request
+SUCCESS, ERROR, TIMEOUT = 'success', 'error', 'timeout'
+
+_ERROR_CODE = re.compile(r'<Code>\s*([^<]+?)\s*</Code>')
+
+
+def _count(outcomes, outcome):
+    # deque.count() is only available from Python 2.7 onward!
+    return len([item for item in outcomes if item == outcome])
+
+
+class _Circuit (object):
+
+    """
+    State of the circuit for a single host.
+    """
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.window = window
+        self.outcomes = collections.deque()  # of the last window requests
+        self.opened = None  # time the circuit was opened
+        self.trials = 0  # requests in flight while half-open
+
+
+class CircuitBreaker (object):
+
+    """
+    Keeps track of the requests sent to each host. Once the last ``window``
+    requests to a host (at least ``min_calls`` of them) contain at least
+    ``error_rate`` failures or at least ``timeout_rate`` timeouts, the
+    circuit for this host *opens*: for ``reset_timeout`` seconds all requests
+    fail immediately with :class:`~amazonproduct.errors.CircuitOpen`. After
+    that, the circuit is *half-open* and up to ``trial_calls`` requests are
+    let through. If they succeed, the circuit is *closed* again; otherwise it
+    opens for another ``reset_timeout`` seconds.
+
+    Failures are network errors, timeouts and HTTP status 5xx. Errors Amazon
+    reports for a request (e.g. an invalid parameter) mean the host is well.
+    This includes throttled requests (see :attr:`HEALTHY_CODES`) even though
+    they come with HTTP status 503.
+
+    A breaker can be shared by several :class:`~amazonproduct.api.API`
+    instances (each host has its own circuit)::
+
+        breaker = CircuitBreaker(error_rate=.5, reset_timeout=30)
+        api_de = API(locale='de', breaker=breaker)
+        api_jp = API(locale='jp', breaker=breaker)
+        if breaker.state(api_jp.host) != CLOSED:
+            ...
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Number of most recent requests per host taken into account
+    WINDOW = 20
+
+    #: Min number of requests before a circuit may open
+    MIN_CALLS = 10
+
+    #: Rate of failed requests (including timeouts) which opens the circuit
+    ERROR_RATE = .5
+
+    #: Rate of timed out requests which opens the circuit
+    TIMEOUT_RATE = .25
+
+    #: Seconds a circuit stays open before requests are let through again
+    RESET_TIMEOUT = 30
+
+    #: Number of requests let through while a circuit is half-open
+    TRIAL_CALLS = 1
+
+    #: Error codes of 5xx responses which do not count as failures as they
+    #: concern the account rather than the host
+    HEALTHY_CODES = ('RequestThrottled', 'AccountLimitExceeded')
+
+    def __init__(self, window=None, min_calls=None, error_rate=None,
+                 timeout_rate=None, reset_timeout=None, trial_calls=None,
+                 on_change=None):
+        """
+        :param window: number of most recent requests per host considered.
+        :param min_calls: min number of requests before a circuit may open.
+        :param error_rate: rate of failed requests which opens the circuit.
+        :param timeout_rate: rate of timed out requests which opens the
+          circuit.
+        :param reset_timeout: seconds before an open circuit lets requests
+          through again.
+        :param trial_calls: number of requests let through while half-open.
+        :param on_change: function called as ``on_change(host, old, new)``
+          whenever the state of a circuit changes. It must not block as the
+          breaker is locked in the meantime.
+        """
+        self.window = window or self.WINDOW
+        self.min_calls = min_calls or self.MIN_CALLS
+        self.error_rate = error_rate or self.ERROR_RATE
+        self.timeout_rate = timeout_rate or self.TIMEOUT_RATE
+        if reset_timeout is None:
+            reset_timeout = self.RESET_TIMEOUT
+        self.reset_timeout = reset_timeout
+        self.trial_calls = trial_calls or self.TRIAL_CALLS
+        self.on_change = on_change
+        self._circuits = {}  # host -> _Circuit
+        # re-entrant, so that on_change may ask for the state of a circuit
+        self._lock = threading.RLock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s/%s) at %s>' % (self.__class__.__name__,
+            self.error_rate, self.timeout_rate, hex(id(self)))
+
+    def _circuit(self, host):
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = _Circuit(self.window)
+        return circuit
+
+    def _update(self, host, circuit, now):
+        """
+        Returns the current state of ``circuit`` (which is half-open once an
+        open circuit has timed out).
+        """
+        if circuit.state == OPEN and now - circuit.opened >= self.reset_timeout:
+            return self._set_state(host, circuit, HALF_OPEN, now)
+        return circuit.state
+
+    def _set_state(self, host, circuit, state, now):
+        """
+        Changes the state of ``circuit`` and notifies :attr:`on_change`.
+        """
+        old, circuit.state = circuit.state, state
+        if state == OPEN:
+            circuit.opened = now
+        if state != HALF_OPEN:
+            circuit.trials = 0
+        if state == CLOSED:
+            circuit.outcomes.clear()
+        if old != state and self.on_change is not None:
+            self.on_change(host, old, state)
+        return state
+
+    def state(self, host):
+        """
+        Returns the state of the circuit for ``host`` (:data:`CLOSED`,
+        :data:`OPEN` or :data:`HALF_OPEN`).
+        """
+        self._lock.acquire()
+        try:
+            return self._update(host, self._circuit(host), time.time())
+        finally:
+            self._lock.release()
+
+    def states(self):
+        """
+        Returns a dict with the state of the circuit for each host requests
+        have been sent to.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            return dict((host, self._update(host, circuit, now))
+                        for host, circuit in self._circuits.items())
+        finally:
+            self._lock.release()
+
+    def rates(self, host):
+        """
+        Returns the rates of failed and of timed out requests among the
+        recent requests to ``host``.
+        """
+        self._lock.acquire()
+        try:
+            outcomes = self._circuit(host).outcomes
+            if not outcomes:
+                return 0.0, 0.0
+            failed = len(outcomes) - _count(outcomes, SUCCESS)
+            total = float(len(outcomes))
+            return failed / total, _count(outcomes, TIMEOUT) / total
+        finally:
+            self._lock.release()
+
+    def trip(self, host):
+        """
+        Opens the circuit for ``host`` (e.g. to shed load from a locale known
+        to be in trouble).
+        """
+        self._lock.acquire()
+        try:
+            self._set_state(host, self._circuit(host), OPEN, time.time())
+        finally:
+            self._lock.release()
+
+    def reset(self, host):
+        """
+        Closes the circuit for ``host`` and forgets its recent requests.
+        """
+        self._lock.acquire()
+        try:
+            self._set_state(host, self._circuit(host), CLOSED, time.time())
+        finally:
+            self._lock.release()
+
+    def before(self, host):
+        """
+        Called before a request to ``host`` is sent. Raises
+        :class:`~amazonproduct.errors.CircuitOpen` if it must not be sent.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            circuit = self._circuit(host)
+            state = self._update(host, circuit, now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and circuit.trials < self.trial_calls:
+                circuit.trials += 1
+                return
+            retry_after = max(circuit.opened + self.reset_timeout - now, 0)
+        finally:
+            self._lock.release()
+        raise CircuitOpen(host, retry_after)
+
+    def after(self, host, outcome):
+        """
+        Records the ``outcome`` (:data:`SUCCESS`, :data:`ERROR` or
+        :data:`TIMEOUT`) of a request to ``host``. ``None`` means the request
+        was not sent at all.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            circuit = self._circuit(host)
+            state = self._update(host, circuit, now)
+            if outcome is None:
+                if state == HALF_OPEN and circuit.trials > 0:
+                    circuit.trials -= 1
+                return
+            if state == HALF_OPEN:
+                if outcome == SUCCESS:
+                    self._set_state(host, circuit, CLOSED, now)
+                else:
+                    self._set_state(host, circuit, OPEN, now)
+                return
+            circuit.outcomes.append(outcome)
+            if len(circuit.outcomes) > circuit.window:
+                circuit.outcomes.popleft()
+            if state == CLOSED and self._tripped(circuit.outcomes):
+                self._set_state(host, circuit, OPEN, now)
+        finally:
+            self._lock.release()
+
+    def _tripped(self, outcomes):
+        total = len(outcomes)
+        if total < self.min_calls:
+            return False
+        failed = total - _count(outcomes, SUCCESS)
+        return (failed >= self.error_rate * total
+                or _count(outcomes, TIMEOUT) >= self.timeout_rate * total)
+
+    def classify(self, error):
+        """
+        Returns the outcome of a request which raised ``error`` (``None`` if
+        the request was given up before it was sent).
+        """
+        if isinstance(error, DeadlineExceeded):
+            return None
+        if isinstance(error, urllib2.HTTPError):
+            if error.code >= 500 and self._error_code(error) \
+                    not in self.HEALTHY_CODES:
+                return ERROR
+            return SUCCESS
+        if isinstance(error, urllib2.URLError):
+            error = getattr(error, 'reason', None)
+        if isinstance(error, socket.timeout):
+            return TIMEOUT
+        if isinstance(error, (socket.error, httplib.HTTPException)):
+            return ERROR
+        return SUCCESS
+
+    def _error_code(self, error):
+        """
+        Returns the error code Amazon sent along with HTTP error ``error``
+        (or ``None``). The body is buffered so that it can still be read
+        (and parsed) afterwards.
+        """
+        if error.fp is None:
+            return None
+        body = error.fp.read()
+        error.fp = StringIO.StringIO(body)
+        error.read, error.readline = error.fp.read, error.fp.readline
+        match = _ERROR_CODE.search(body)
+        if match is not None:
+            return match.group(1)
+
+    def call(self, host, fn, *args, **kwargs):
+        """
+        Calls ``fn(*args, **kwargs)`` which sends a request to ``host`` unless
+        its circuit is open.
+        """
+        self.before(host)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            exc_info = sys.exc_info()
+            self.after(host, self.classify(exc_info[1]))
+            raise exc_info[0], exc_info[1], exc_info[2]
+        self.after(host, SUCCESS)
+        return result
@@ -0,0 +1,131 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Looking up any number of items at once. Amazon accepts no more than 10
+ItemIds per ItemLookup request, so longer lists have to be split up.
+"""
+
+from collections import deque
+import itertools
+
+from amazonproduct.errors import InvalidParameterValue
+from amazonproduct.processors import ITEMS_PAGINATOR
+from amazonproduct.utils import ClosingIterator
+from amazonproduct.workers import WorkerPool
+
+
+class BulkItemLookup (object):
+
+    """
+    Iterates over the items for an arbitrary number of ItemIds (ASINs, EANs,
+    UPCs, SKUs, ...) which are looked up 10 at a time. Usually you will get
+    an instance from :meth:`~amazonproduct.api.API.bulk_item_lookup`::
+
+        lookup = api.bulk_item_lookup(asins, ResponseGroup='Large')
+        for item in lookup:
+            print item.ItemAttributes.Title
+        print 'not found:', lookup.missing
+
+    Items are returned in the order of their requests which follow the order
+    of the ItemIds. ItemIds Amazon does not know are collected in ``missing``
+    (the remaining ItemIds of the same request are looked up again without
+    them) rather than raising :exc:`~amazonproduct.errors.InvalidParameterValue`.
+
+    With ``workers=<n>`` up to ``n`` requests are sent concurrently (still
+    within the API's rate limit).
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Max number of ItemIds per request allowed by Amazon
+    CHUNK_SIZE = 10
+
+    def __init__(self, api, ids, workers=None, **params):
+        """
+        :param api: :class:`~amazonproduct.api.API` instance used.
+        :param ids: iterable of ItemIds (which may be a generator).
+        :param workers: number of requests sent concurrently.
+        :param params: additional parameters passed to
+          :meth:`~amazonproduct.api.API.item_lookup` for each request.
+        """
+        self.api = api
+        self.ids = ids
+        self.workers = workers
+        self.params = params
+        self.missing = []
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s %s at %s>' % (
+            self.__class__.__name__, self.params, hex(id(self)))
+
+    def _chunks(self):
+        ids = iter(self.ids)
+        while True:
+            chunk = list(itertools.islice(ids, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            yield chunk
+
+    def _items(self, root):
+        """
+        Returns the items of a parsed response using the processor's items
+        paginator (whose ``iterate()`` only depends on class attributes).
+        """
+        paginator = self.api.processor.paginators[ITEMS_PAGINATOR]
+        return paginator.__new__(paginator).iterate(root)
+
+    def _lookup(self, ids):
+        """
+        Looks up ``ids`` and returns ``(response, missing ids)``.
+        ``response`` is ``None`` if none of the ids were found.
+        """
+        ids = list(ids)
+        missing = []
+        while ids:
+            try:
+                return self.api.item_lookup(*ids, **self.params), missing
+            except InvalidParameterValue, e:
+                parameter, value = e.args
+                if parameter != 'ItemId' or value not in ids:
+                    raise
+                missing.append(ids.pop(ids.index(value)))
+                # if this was the only unknown ItemId, the response already
+                # contains all other items
+                if (e.xml is not None
+                and len(list(self._items(e.xml))) == len(ids)):
+                    return e.xml, missing
+        return None, missing
+
+    def _results(self):
+        """
+        Returns an iterator over ``(response, missing ids)`` for each chunk
+        of ItemIds.
+        """
+        if not self.workers:
+            return itertools.imap(self._lookup, self._chunks())
+
+        pool = WorkerPool(self.workers)
+        pending = deque()
+        def cleanup():
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+        return ClosingIterator(self._pipelined(pool, pending), cleanup)
+
+    def _pipelined(self, pool, pending):
+        for chunk in self._chunks():
+            pending.append(pool.submit(self._lookup, chunk))
+            if len(pending) > self.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def __iter__(self):
+        for root, missing in self._results():
+            self.missing.extend(missing)
+            if root is not None:
+                for item in self._items(root):
+                    yield item
@@ -0,0 +1,307 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Persistent HTTP/1.1 connections to Amazon's web service endpoints.
+
+``urllib2`` closes the connection after each request which means one TCP
+handshake (and one DNS lookup) for every single call. A
+:class:`ConnectionPool` keeps connections to each host open and reuses them
+for subsequent requests.
+"""
+
+import errno
+import httplib
+import socket
+import sys
+import threading
+import time
+import urllib2
+import urlparse
+import zlib
+
+# httplib connections only accept a timeout from Python 2.6 onward. Before,
+# they connect with the global default timeout (see
+# socket.setdefaulttimeout()) and only the read timeout can be set.
+_CONNECT_TIMEOUT = sys.version_info[:2] >= (2, 6)
+_DEFAULT_TIMEOUT = getattr(socket, '_GLOBAL_DEFAULT_TIMEOUT', object())
+
+class PooledResponse (object):
+
+    """
+    File-like wrapper around a :class:`httplib.HTTPResponse`. As soon as the
+    response body has been read completely, the underlying connection is
+    handed back to the pool it came from.
+    """
+
+    def __init__(self, pool, host, conn, response):
+        self._pool = pool
+        self._host = host
+        self._conn = conn
+        self._response = response
+        self._buffer = ''
+
+    def _release(self):
+        if self._conn is not None:
+            self._pool._put_connection(self._host, self._conn, self._response)
+            self._conn = None
+
+    def read(self, amt=None):
+        data, self._buffer = self._buffer, ''
+        if amt is None:
+            data += self._response.read()
+        elif len(data) < amt:
+            data += self._response.read(amt - len(data))
+        else:
+            data, self._buffer = data[:amt], data[amt:]
+        if self._response.isclosed():
+            self._release()
+        return data
+
+    def readline(self):
+        while '\n' not in self._buffer:
+            chunk = self._response.read(8192)
+            if not chunk:
+                break
+            self._buffer += chunk
+        if self._response.isclosed():
+            self._release()
+        pos = self._buffer.find('\n') + 1 or len(self._buffer)
+        line, self._buffer = self._buffer[:pos], self._buffer[pos:]
+        return line
+
+    def close(self):
+        """
+        Closes the response. Unless the body was read completely, the
+        connection cannot be reused and is closed as well.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._response.close()
+
+
+class GzipStream (object):
+
+    """
+    File-like object which inflates gzip encoded content incrementally while
+    it is read from ``fp``. Unlike :class:`gzip.GzipFile` it does not need the
+    complete (seekable) body up front, so parsing can start as soon as the
+    first bytes arrive and memory usage does not grow with the response size.
+    """
+
+    #: Number of compressed bytes read from ``fp`` at once
+    CHUNK_SIZE = 16384
+
+    def __init__(self, fp):
+        self.fp = fp
+        # 16 + MAX_WBITS tells zlib to expect a gzip header and trailer
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = ''
+        self._eof = False
+
+    def _fill(self, size=None):
+        """
+        Inflates data until at least ``size`` bytes (or everything if ``size``
+        is ``None``) are buffered or the end of the stream is reached.
+        """
+        chunks = [self._buffer]
+        buffered = len(self._buffer)
+        while not self._eof and (size is None or buffered < size):
+            data = self.fp.read(self.CHUNK_SIZE)
+            if data:
+                data = self._inflater.decompress(data)
+            else:
+                data = self._inflater.flush()
+                self._eof = True
+            chunks.append(data)
+            buffered += len(data)
+        self._buffer = ''.join(chunks)
+
+    def read(self, size=None):
+        if size is not None and size < 0:
+            size = None
+        self._fill(size)
+        if size is None:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self):
+        while '\n' not in self._buffer and not self._eof:
+            self._fill(len(self._buffer) + 1)
+        pos = self._buffer.find('\n') + 1 or len(self._buffer)
+        line, self._buffer = self._buffer[:pos], self._buffer[pos:]
+        return line
+
+    def close(self):
+        self.fp.close()
+
+
+class ConnectionPool (object):
+
+    """
+    Keeps HTTP/1.1 connections open per host and reuses them across calls.
+    The pool is thread-safe and may be shared by several
+    :class:`~amazonproduct.api.API` instances. ::
+
+        pool = ConnectionPool(maxsize=8, idle_timeout=30)
+        api = API(locale='de', pool=pool)
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Max number of idle connections kept open per host
+    MAXSIZE = 4
+
+    #: Seconds after which an idle connection is no longer reused
+    IDLE_TIMEOUT = 60
+
+    connection_class = httplib.HTTPConnection
+
+    def __init__(self, maxsize=None, idle_timeout=None):
+        """
+        :param maxsize: max number of idle connections kept open per host.
+        :param idle_timeout: seconds after which an idle connection is closed
+          rather than reused (Amazon will drop it sooner or later anyway).
+        """
+        if maxsize is None:
+            maxsize = self.MAXSIZE
+        if idle_timeout is None:
+            idle_timeout = self.IDLE_TIMEOUT
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = {}  # host -> [(connection, time last used), ...]
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s/%ss) at %s>' % (self.__class__.__name__,
+            self.maxsize, self.idle_timeout, hex(id(self)))
+
+    def _get_connection(self, host, timeout=_DEFAULT_TIMEOUT):
+        """
+        Returns ``(connection, reused)`` for ``host``. The most recently used
+        idle connection is preferred; idle connections which have timed out
+        are closed. New connections use ``timeout`` to connect.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            idle = self._idle.get(host, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        finally:
+            self._lock.release()
+        if timeout is _DEFAULT_TIMEOUT or not _CONNECT_TIMEOUT:
+            return self.connection_class(host), False
+        return self.connection_class(host, timeout=timeout), False
+
+    def _put_connection(self, host, conn, response):
+        """
+        Returns a connection to the pool once its response has been read.
+        """
+        if response.will_close:
+            conn.close()
+            return
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(host, [])
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+                return
+        finally:
+            self._lock.release()
+        conn.close()
+
+    def clear(self):
+        """
+        Closes all idle connections.
+        """
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, {}
+        finally:
+            self._lock.release()
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
+
+    def urlopen(self, url, headers=None, debuglevel=0, timeout=None):
+        """
+        Sends a GET request for ``url`` and returns a file-like response. It
+        behaves like :func:`urllib2.urlopen`, i.e. an HTTP status other than
+        200 raises an :class:`urllib2.HTTPError` and network problems are
+        raised as :class:`urllib2.URLError`.
+
+        :param timeout: seconds to wait for the connection to be established
+          and for each read as ``(connect, read)`` tuple or a single number
+          for both. If omitted, the global default timeout is used.
+        """
+        _, host, path, query, _ = urlparse.urlsplit(url)
+        if query:
+            path = '%s?%s' % (path, query)
+        headers = dict(headers or {})
+        headers['Accept-Encoding'] = 'gzip'
+        connect_timeout, read_timeout = split_timeout(timeout)
+
+        while True:
+            conn, reused = self._get_connection(host, connect_timeout)
+            conn.set_debuglevel(debuglevel)
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                if read_timeout is not _DEFAULT_TIMEOUT:
+                    conn.sock.settimeout(read_timeout)
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                break
+            except socket.timeout, e:
+                conn.close()
+                raise urllib2.URLError(e)
+            except (socket.error, httplib.HTTPException), e:
+                conn.close()
+                # A connection kept alive may have been dropped by the server
+                # in the meantime. In this case simply try a fresh one.
+                if reused and _is_stale(e):
+                    continue
+                raise urllib2.URLError(e)
+
+        fp = PooledResponse(self, host, conn, response)
+        if response.getheader('content-encoding') == 'gzip':
+            fp = GzipStream(fp)
+        resp = urllib2.addinfourl(fp, response.msg, url)
+        resp.code = response.status
+        resp.msg = response.reason
+        if response.status != 200:
+            raise urllib2.HTTPError(
+                url, response.status, response.reason, response.msg, resp)
+        return resp
+
+
+def split_timeout(timeout):
+    """
+    Returns ``(connect timeout, read timeout)`` for ``timeout`` which is
+    either such a tuple, a single number for both or ``None`` (in which case
+    the global default timeout is used).
+    """
+    if timeout is None:
+        return _DEFAULT_TIMEOUT, _DEFAULT_TIMEOUT
+    if isinstance(timeout, tuple):
+        return timeout
+    return timeout, timeout
+
+
+def _is_stale(error):
+    """
+    Is ``error`` caused by a persistent connection closed by the server?
+    """
+    if isinstance(error, httplib.BadStatusLine):
+        return True
+    return getattr(error, 'errno', None) in (
+        errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
@@ -0,0 +1,81 @@
+from amazonproduct.api import API
+from amazonproduct.workers import WorkerPool
+
+
+def _submitted(method):
+    """
+    Turns a blocking :class:`~amazonproduct.api.API` operation into one which
+    is executed by the worker pool and returns a
+    :class:`~amazonproduct.workers.Future` immediately.
+    """
+    def wrapper(self, *args, **kwargs):
+        return self.workers.submit(method, self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class AsyncAPI (API):
+
+    """
+    API whose operations return a :class:`~amazonproduct.workers.Future`
+    immediately rather than blocking until Amazon has answered. The requests
+    are sent by a fixed number of worker threads (so fanning out thousands of
+    lookups does not need a thread per request) which share URL signing,
+    result processor and rate limiter of this instance. ::
+
+        api = AsyncAPI(locale='de', workers=4)
+        futures = [api.item_lookup(asin) for asin in asins]
+        for future in futures:
+            root = future.result()
+
+    Operations which support pagination return a future of the paginator
+    (with its first page already fetched). :meth:`iterpages` can then be used
+    to fetch the remaining pages in the background.
+
+    .. note:: There is no :mod:`asyncio` in Python 2. This is the nearest
+       equivalent using a bounded pool of threads.
+    """
+
+    #: Default number of worker threads
+    WORKERS = 8
+
+    def __init__(self, *args, **kwargs):
+        """
+        :param workers: number of worker threads or a
+          :class:`~amazonproduct.workers.WorkerPool` instance (which may be
+          shared with other APIs).
+        """
+        workers = kwargs.pop('workers', self.WORKERS)
+        API.__init__(self, *args, **kwargs)
+        if not isinstance(workers, WorkerPool):
+            workers = WorkerPool(workers)
+        self.workers = workers
+
+    item_lookup = _submitted(API.item_lookup)
+    item_search = _submitted(API.item_search)
+    similarity_lookup = _submitted(API.similarity_lookup)
+    browse_node_lookup = _submitted(API.browse_node_lookup)
+    cart_create = _submitted(API.cart_create)
+    cart_add = _submitted(API.cart_add)
+    cart_modify = _submitted(API.cart_modify)
+    cart_get = _submitted(API.cart_get)
+    cart_clear = _submitted(API.cart_clear)
+
+    def iterpages(self, paginator):
+        """
+        Iterates over all pages of ``paginator`` (or a future of one) yielding
+        a :class:`~amazonproduct.workers.Future` for each page. The following
+        page is always requested before the current one is handed out, so it
+        is already on its way while you are processing the current one.
+        """
+        if hasattr(paginator, 'result'):
+            paginator = paginator.result()
+        pending = None
+        for index in range(1, len(paginator) + 1):
+            future = self.workers.submit(paginator.page, index)
+            if pending is not None:
+                yield pending
+            pending = future
+        if pending is not None:
+            yield pending
@@ -1,61 +1,650 @@
+import copy
+import errno
 import os
+from StringIO import StringIO
+import struct
+import threading
 import time
 import tempfile
-from lxml import etree
+import urlparse
+import zlib
 
 try: # make it python2.4 compatible!
     from hashlib import md5 # pylint: disable-msg=E0611
 except ImportError: # pragma: no cover
     from md5 import new as md5
 
+try: # make it python2.4/2.5 compatible!
+    from urlparse import parse_qs
+except ImportError: # pragma: no cover
+    from cgi import parse_qs
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # not available on Windows
+
+try:
+    import sqlite3
+except ImportError:  # pragma: no cover
+    sqlite3 = None  # not available on Google App Engine
+
 from amazonproduct.api import API
+from amazonproduct.errors import AWSError, InvalidParameterValue
+from amazonproduct.errors import NoExactMatchesFound, InvalidSearchIndex
+from amazonproduct.errors import InvalidResponseGroup, InvalidListType
+from amazonproduct.errors import MissingParameters, NotEnoughParameters
+from amazonproduct.errors import InvalidParameterCombination
+from amazonproduct.errors import ParameterOutOfRange, InvalidOperation
+from amazonproduct.errors import DeprecatedOperation
+from amazonproduct.connection import GzipStream
+from amazonproduct.utils import LRUCache
+from amazonproduct.workers import WorkerPool
 
 DEFAULT_CACHE_DIR = tempfile.mkdtemp(prefix='amzn_')
 
+#: First bytes of gzip compressed data
+GZIP_MAGIC = '\x1f\x8b'
+
+
+def compress(data, level=6):
+    """
+    Returns ``data`` compressed in gzip format.
+    """
+    # 16 + MAX_WBITS tells zlib to write a gzip header and trailer
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def open_response(data):
+    """
+    Returns a file-like object over a stored response which is inflated while
+    it is read if it has been stored compressed.
+    """
+    if data.startswith(GZIP_MAGIC):
+        return GzipStream(StringIO(data))
+    return StringIO(data)
+
+
+
+def _makedirs(path):
+    """
+    Creates directory ``path`` (including its parents) unless it exists,
+    which another process may have just made happen.
+    """
+    try:
+        os.makedirs(path)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+class Storage (object):
+
+    """
+    Interface of storage backends for :class:`ResponseCachingAPI`. Responses
+    are stored under a key (the MD5 hash of the request URL as hex string)
+    together with the time they were fetched. Backends must be safe to use
+    from several threads and processes at the same time.
+
+    .. versionadded:: 0.2.9
+    """
+
+    def get(self, key):
+        """
+        Returns ``(time fetched, response)`` for ``key`` or ``None``.
+        """
+        raise NotImplementedError
+
+    def put(self, key, data, fetched):
+        """
+        Stores response ``data`` fetched at ``fetched`` (seconds since the
+        epoch) under ``key``, replacing any previous one.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Releases all resources held by the storage.
+        """
+
+
+class FileStorage (Storage):
+
+    """
+    Stores each response in a file ``<key>.xml`` in directory ``path``.
+    Files are written to a temporary file first and then renamed, so readers
+    never see half-written responses.
+
+    .. versionadded:: 0.2.9
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            _makedirs(path)
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s) at %s>' % (
+            self.__class__.__name__, self.path, hex(id(self)))
+
+    def _path(self, key):
+        return os.path.join(self.path, '%s.xml' % key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            fp = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            return os.fstat(fp.fileno()).st_mtime, fp.read()
+        finally:
+            fp.close()
+
+    def put(self, key, data, fetched):
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            _makedirs(dirname)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.utime(tmp, (fetched, fetched))
+            try:
+                os.rename(tmp, path)
+            except OSError:  # pragma: no cover
+                os.remove(path)  # Windows does not replace existing files
+                os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+
+class ShardedFileStorage (FileStorage):
+
+    """
+    Like :class:`FileStorage` but spreads the files over ``levels`` levels of
+    sub directories named after the first characters of the key (e.g.
+    ``3f/a2/3fa2...xml``), so that no directory holds more than a few
+    thousand files even with millions of cached responses.
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Default number of sub directory levels
+    LEVELS = 2
+
+    #: Number of key characters used for each level
+    WIDTH = 2
+
+    def __init__(self, path, levels=None):
+        FileStorage.__init__(self, path)
+        if levels is None:
+            levels = self.LEVELS
+        self.levels = levels
+
+    def _path(self, key):
+        parts = [key[i * self.WIDTH:(i + 1) * self.WIDTH]
+                 for i in range(self.levels)]
+        return os.path.join(self.path, *(parts + ['%s.xml' % key]))
+
+
+class SQLiteStorage (Storage):
+
+    """
+    Stores all responses in a single SQLite database. Write-ahead logging
+    (WAL) is used so that readers in other processes are never blocked by a
+    writer. Each thread uses its own connection.
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Seconds to wait for a lock held by another process
+    TIMEOUT = 30
+
+    def __init__(self, path):
+        if sqlite3 is None:  # pragma: no cover
+            raise ImportError('SQLiteStorage requires module sqlite3!')
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                     'key TEXT PRIMARY KEY, fetched REAL, data BLOB)')
+        conn.commit()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s) at %s>' % (
+            self.__class__.__name__, self.path, hex(id(self)))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.TIMEOUT)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT fetched, data FROM responses WHERE key = ?',
+            (key, )).fetchone()
+        if row is not None:
+            return row[0], str(row[1])
+
+    def put(self, key, data, fetched):
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)',
+                     (key, fetched, sqlite3.Binary(data)))
+        conn.commit()
+
+    def close(self):
+        """
+        Closes the connection of the calling thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class LogStorage (Storage):
+
+    """
+    Append-only store which writes all responses to a single log file. Each
+    record consists of a header (key, time fetched and length) followed by
+    the response. An index of the latest record for each key is kept in
+    memory and updated from the log whenever another process (or instance)
+    has appended to it.
+
+    Writers serialise appends with ``fcntl`` locks. Readers need no locks:
+    a record is only indexed once it has been written completely.
+
+    .. note:: Replaced responses are not removed from the log, so it grows
+       forever. Simply delete the file to start afresh. Only available on
+       Unix systems.
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: key (MD5 hex digest), time fetched, length of response
+    _header = '!32sdI'
+    _header_size = struct.calcsize(_header)
+
+    def __init__(self, path):
+        if fcntl is None:  # pragma: no cover
+            raise ImportError('LogStorage requires module fcntl!')
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0644)
+        self._index = {}  # key -> (time fetched, offset, length)
+        self._indexed = 0  # bytes of the log indexed so far
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s) at %s>' % (
+            self.__class__.__name__, self.path, hex(id(self)))
+
+    def _read(self, offset, length):
+        os.lseek(self._fd, offset, 0)  # os.SEEK_SET (Python 2.5+)
+        chunks = []
+        while length > 0:
+            chunk = os.read(self._fd, length)
+            if not chunk:  # pragma: no cover
+                break
+            chunks.append(chunk)
+            length -= len(chunk)
+        return ''.join(chunks)
+
+    def _update_index(self):
+        """
+        Indexes all records appended since the last call.
+        """
+        size = os.fstat(self._fd).st_size
+        offset = self._indexed
+        while offset + self._header_size <= size:
+            key, fetched, length = struct.unpack(self._header,
+                self._read(offset, self._header_size))
+            start = offset + self._header_size
+            if start + length > size:
+                break  # still being written
+            self._index[key] = (fetched, start, length)
+            offset = start + length
+        self._indexed = offset
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            self._update_index()
+            try:
+                fetched, offset, length = self._index[key]
+            except KeyError:
+                return None
+            return fetched, self._read(offset, length)
+        finally:
+            self._lock.release()
+
+    def put(self, key, data, fetched):
+        record = struct.pack(self._header, key, fetched, len(data)) + data
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                while record:
+                    record = record[os.write(self._fd, record):]
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Closes the log file.
+        """
+        os.close(self._fd)
+
 class ResponseCachingAPI (API):
 
     """
     This API stores each response from Amazon in an XML file and uses these for
     subsequent requests. File are name with a hash based on submitted parameters
-    in URL (excluding Timestamp and Signature).
+    in URL (excluding Timestamp and Signature). Other ways of storing
+    responses can be used by passing a :class:`Storage` instance (e.g.
+    :class:`SQLiteStorage`) as ``storage``.
 
     Using this class is an excellent idea during development!
 
+    The most recently used responses are additionally kept in memory (see
+    attribute ``memcache`` for hit, miss and eviction counts) so that hot
+    requests do not even touch the file system. Optionally, parsed results
+    can be cached as well (``resultsize``) which saves parsing them again.
+
     This class is based on code by Dmitry Chaplinsky
     https://gist.github.com/657174
     """
 
+    #: Max number of responses kept in memory (``None`` for no limit)
+    MEMCACHE_SIZE = 128
+
+    #: Max number of bytes kept in memory (``None`` for no limit)
+    MEMCACHE_BYTES = 8 * 1024 * 1024
+
+    #: Max number of parsed results kept in memory (``0`` for none)
+    RESULTCACHE_SIZE = 0
+
+    #: Store responses gzip compressed?
+    COMPRESS = False
+
+    #: Number of threads fetching expired responses in the background
+    REFRESH_WORKERS = 2
+
+    #: Max number of errors kept in memory
+    ERRORCACHE_SIZE = 1024
+
+    #: Errors which will occur again for the same request (as opposed to
+    #: e.g. :class:`~amazonproduct.errors.InternalError` or
+    #: :class:`~amazonproduct.errors.TooManyRequests`) and may be cached
+    CACHED_ERRORS = (
+        InvalidParameterValue, NoExactMatchesFound, InvalidSearchIndex,
+        InvalidResponseGroup, InvalidListType, MissingParameters,
+        NotEnoughParameters, InvalidParameterCombination, ParameterOutOfRange,
+        InvalidOperation, DeprecatedOperation,
+    )
+
+    #: Codes of cachable errors which are not converted into a specific
+    #: exception until later (e.g. ``NoSimilarityForASIN`` in
+    #: :meth:`similarity_lookup`)
+    CACHED_ERROR_CODES = (
+        'AWS.ECommerceService.NoSimilarities',
+        'AWS.ECommerceService.NoExactMatches',
+        'AWS.InvalidParameterValue',
+    )
+
     def __init__(self, *args, **kwargs):
         """
         :param cachedir: Path to directory containing cached responses.
+        :param storage: :class:`Storage` used instead of ``cachedir``.
+        :param cachetime: Number of seconds after which a cached response is
+          fetched again (default: never).
+        :param cachetimes: Dictionary of operations and/or response groups
+          with their own cache times, e.g. ``{'BrowseNodeLookup': 86400,
+          'Offers': 600}``. If several apply, the shortest one is used.
+        :param stale: Number of seconds an expired response is still used
+          while it is fetched again in the background.
+        :param errortime: Number of seconds errors which will not go away by
+          themselves (see :attr:`CACHED_ERRORS`) are cached in memory and
+          raised again without asking Amazon (default: not at all).
+        :param memsize: Max number of responses kept in memory. Use ``0`` to
+          switch the in-memory cache off.
+        :param membytes: Max number of bytes kept in memory.
+        :param resultsize: Max number of parsed results kept in memory. Each
+          call returns a copy of the cached result, so modifying it does not
+          affect other callers. Not available with processors whose results
+          can be used only once (e.g.
+          :mod:`~amazonproduct.processors.iterparse`).
+        :param compress: Store responses (on disk and in memory) gzip
+          compressed.
+
+        .. versionadded:: 0.2.9
+           Parameters ``storage``, ``cachetimes``, ``stale``, ``errortime``,
+           ``memsize``, ``membytes``, ``resultsize`` and ``compress``.
         """
+        self.storage = kwargs.pop('storage', None)
         self.cache = kwargs.pop('cachedir', DEFAULT_CACHE_DIR)
         self.cachetime = kwargs.pop('cachetime', False) # i.e. indefinite
+        self.cachetimes = kwargs.pop('cachetimes', {})
+        self.stale = kwargs.pop('stale', 0)
+        self.errortime = kwargs.pop('errortime', 0)
+        memsize = kwargs.pop('memsize', self.MEMCACHE_SIZE)
+        membytes = kwargs.pop('membytes', self.MEMCACHE_BYTES)
+        resultsize = kwargs.pop('resultsize', self.RESULTCACHE_SIZE)
+        self.compress = kwargs.pop('compress', self.COMPRESS)
         API.__init__(self, *args, **kwargs)
-        if self.cache and not os.path.isdir(self.cache):
-            os.mkdir(self.cache)
+        if self.storage is None and self.cache:
+            self.storage = FileStorage(self.cache)
+        self.memcache = None
+        if memsize != 0 and membytes != 0:
+            # entries are (time fetched, response)
+            self.memcache = LRUCache(memsize, membytes,
+                                     sizeof=lambda entry: len(entry[1]))
+        self.resultcache = None
+        if resultsize != 0:
+            if not getattr(self.processor, 'reusable', True):
+                raise ValueError('Results of %s cannot be cached!'
+                                 % self._processor_module)
+            # entries are (time fetched, parsed result)
+            self.resultcache = LRUCache(resultsize)
+        self.errorcache = None
+        if self.errortime:
+            # entries are (time raised, error)
+            self.errorcache = LRUCache(self.ERRORCACHE_SIZE)
+        # time at which the response last returned by _fetch() was fetched
+        self._local = threading.local()
+        self._refresher = None  # worker pool revalidating stale responses
+        self._refreshing = {}  # key -> future of background refresh
+        self._refreshing_lock = threading.Lock()
+
+    def _cachetime(self, url):
+        """
+        Returns the number of seconds the response for ``url`` may be cached.
+        The shortest of the times configured for its operation and response
+        groups is used (or ``cachetime`` if there are none).
+        """
+        if not self.cachetimes:
+            return self.cachetime
+        query = parse_qs(urlparse.urlsplit(url)[3])
+        names = query.get('Operation', []) + ','.join(
+            query.get('ResponseGroup', [])).split(',')
+        ttls = [self.cachetimes[name] for name in names
+                if self.cachetimes.get(name)]
+        if ttls:
+            return min(ttls)
+        return self.cachetime
+
+    def _is_fresh(self, fetched, ttl):
+        """
+        Can a response fetched at ``fetched`` (seconds since the epoch) still
+        be used?
+        """
+        return not ttl or fetched + ttl > time.time()
+
+    def _is_stale(self, fetched, ttl):
+        """
+        Can an expired response still be used while it is being revalidated?
+        """
+        return self.stale and fetched + ttl + self.stale > time.time()
+
+    def _remember(self, key, fetched, data):
+        self._local.fetched = fetched
+        if self.memcache is not None:
+            self.memcache[key] = (fetched, data)
+
+    def _store(self, key, fetched, data):
+        """
+        Stores response ``data`` fetched at ``fetched`` under ``key``.
+        """
+        if self.storage is not None:
+            self.storage.put(key, data, fetched)
+        self._remember(key, fetched, data)
+
+    def _read(self, resp):
+        """
+        Returns the data of response ``resp`` as it will be stored.
+        """
+        # responses are stored exactly as they were received
+        data = resp.read()
+        if self.compress:
+            data = compress(data)
+        return data
+
+    def _revalidate(self, url, key):
+        """
+        Fetches the response for ``url`` again in the background (unless this
+        is already happening).
+        """
+        self._refreshing_lock.acquire()
+        try:
+            if key in self._refreshing:
+                return
+            if self._refresher is None:
+                self._refresher = WorkerPool(self.REFRESH_WORKERS)
+            self._refreshing[key] = future = self._refresher.submit(
+                self._refresh, url, key)
+        finally:
+            self._refreshing_lock.release()
+        future.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    def _refresh(self, url, key):
+        # if this fails (or Amazon answers with an error), the stale response
+        # will simply be used a bit longer
+        resp = API._fetch(self, url)
+        fetched = time.time()
+        data = self._read(resp)
+        self._parse(open_response(data))
+        self._store(key, fetched, data)
+        if self.resultcache is not None:
+            self.resultcache.pop(key)
+
+    def _is_cachable_error(self, error):
+        return (isinstance(error, self.CACHED_ERRORS)
+                or error.code in self.CACHED_ERROR_CODES)
+
+    def _request(self, url):
+        if self.errorcache is None:
+            return self._cached_request(url)
+        key = self.get_hash(url)
+        entry = self.errorcache.get(key)
+        if entry is not None:
+            if entry[0] + self.errortime > time.time():
+                # each caller gets its own exception
+                raise copy.copy(entry[1])
+            self.errorcache.pop(key)
+        try:
+            return self._cached_request(url)
+        except AWSError, e:
+            if self._is_cachable_error(e):
+                self.errorcache[key] = (time.time(), copy.copy(e))
+            raise
+
+    def _parsed_request(self, url):
+        """
+        Returns the parsed result for ``url``. A response fetched from Amazon
+        is only stored once it has been parsed without raising an error:
+        errors are either not cached at all or only for ``errortime``
+        seconds, even if they come with HTTP status 200.
+        """
+        self._local.pending = None
+        try:
+            result = API._request(self, url)
+            if self._local.pending is not None:
+                self._store(*self._local.pending)
+            return result
+        finally:
+            self._local.pending = None
+
+    def _cached_request(self, url):
+        """
+        Returns the (cached) parsed result for ``url``.
+        """
+        if self.resultcache is None:
+            return self._parsed_request(url)
+        key = self.get_hash(url)
+        entry = self.resultcache.get(key)
+        if entry is not None:
+            ttl = self._cachetime(url)
+            fresh = self._is_fresh(entry[0], ttl)
+            if fresh or self._is_stale(entry[0], ttl):
+                if not fresh:
+                    self._revalidate(url, key)
+                # copy-on-read: the cached result itself is never handed out
+                return copy.deepcopy(entry[1])
+            self.resultcache.pop(key)
+        self._local.fetched = time.time()
+        result = self._parsed_request(url)
+        self.resultcache[key] = (self._local.fetched, copy.deepcopy(result))
+        return result
 
     def _fetch(self, url):
-        if self.cache:
-            path = os.path.join(self.cache, '%s.xml' % self.get_hash(url))
-            # if response was fetched previously, use that one
-            if os.path.isfile(path):
-                if self.cachetime:
-                    if os.path.getmtime(path) + self.cachetime > time.time():
-                        return open(path)
+        key = self.get_hash(url)
+        ttl = self._cachetime(url)
+        stale = None
+        if self.memcache is not None:
+            entry = self.memcache.get(key)
+            if entry is not None:
+                if self._is_fresh(entry[0], ttl):
+                    self._local.fetched = entry[0]
+                    return open_response(entry[1])
+                if self._is_stale(entry[0], ttl):
+                    stale = entry
                 else:
-                    return open(path)
+                    self.memcache.pop(key)
 
-        # fetch original response from Amazon
-        resp = API._fetch(self, url)
+        if stale is None and self.storage is not None:
+            # if response was fetched previously, use that one
+            entry = self.storage.get(key)
+            if entry is not None:
+                if self._is_fresh(entry[0], ttl):
+                    self._remember(key, *entry)
+                    return open_response(entry[1])
+                if self._is_stale(entry[0], ttl):
+                    stale = entry
 
-        if self.cache:
-            fp = open(path, 'w+')
-            fp.write(etree.tostring(etree.parse(resp), pretty_print=True))
-            fp.seek(0)
-            return fp
+        if stale is not None:
+            self._revalidate(url, key)
+            self._local.fetched = stale[0]
+            return open_response(stale[1])
 
-        return resp
+        # fetch original response from Amazon
+        resp = API._fetch(self, url)
+        fetched = self._local.fetched = time.time()
+        if self.storage is None and self.memcache is None:
+            return resp
+        data = self._read(resp)
+        # stored by _parsed_request() unless it turns out to be an error
+        self._local.pending = (key, fetched, data)
+        return open_response(data)
 
     @staticmethod
     def get_hash(url):
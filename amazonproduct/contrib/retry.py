@@ -1,15 +1,259 @@
 
+import collections
+import httplib
+import random
 import socket
+import sys
+import threading
 import time
 import urllib2
 
 from amazonproduct.api import API
+from amazonproduct.errors import AWSError, InternalError, TooManyRequests
+
+
+class RetryBudget (object):
+
+    """
+    Caps the number of retries at a fraction of the requests sent within the
+    last ``ttl`` seconds (plus ``min_retries`` which are always allowed, so
+    that a trickle of requests can still be retried). While Amazon is down,
+    retries will therefore never add more than ``ratio`` to the load. A budget
+    is thread-safe and meant to be shared by all
+    :class:`RetryPolicy` instances of a process (see :data:`DEFAULT_BUDGET`).
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Max number of retries in relation to requests
+    RATIO = .1
+
+    #: Number of retries allowed per ``ttl`` regardless of the ratio
+    MIN_RETRIES = 10
+
+    #: Seconds requests and retries are taken into account
+    TTL = 10
+
+    def __init__(self, ratio=None, min_retries=None, ttl=None):
+        """
+        :param ratio: max number of retries per request (e.g. ``.1`` = 10%).
+        :param min_retries: retries allowed within ``ttl`` in any case.
+        :param ttl: length of the sliding window in seconds.
+        """
+        if ratio is None:
+            ratio = self.RATIO
+        if min_retries is None:
+            min_retries = self.MIN_RETRIES
+        if ttl is None:
+            ttl = self.TTL
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.ttl = ttl
+        self._requests = collections.deque()  # times requests were sent
+        self._retries = collections.deque()  # times retries were sent
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s, min_retries=%s, ttl=%s) at %s>' % (
+            self.__class__.__name__, self.ratio, self.min_retries, self.ttl,
+            hex(id(self)))
+
+    def _expire(self, now):
+        for times in (self._requests, self._retries):
+            while times and times[0] <= now - self.ttl:
+                times.popleft()
+
+    def deposit(self):
+        """
+        Records a request (not a retry!).
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            self._expire(now)
+            self._requests.append(now)
+        finally:
+            self._lock.release()
+
+    def withdraw(self):
+        """
+        Records a retry and returns ``True`` if it is within the budget.
+        Otherwise ``False`` is returned and the retry must not be sent.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            self._expire(now)
+            allowed = self.min_retries + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+        finally:
+            self._lock.release()
+
+
+#: Budget shared by all retry policies unless they are given their own
+DEFAULT_BUDGET = RetryBudget()
+
+
+class RetryPolicy (object):
+
+    """
+    Decides whether, when and how often a failed request is retried:
+
+    * Only errors which are likely to go away by themselves are retried, i.e.
+      those whose type is listed in :attr:`RETRY_EXCEPTIONS` (network
+      problems, also if wrapped in a :class:`urllib2.URLError`), HTTP errors
+      whose status is listed in :attr:`RETRY_STATUS` and Amazon errors whose
+      type is listed in :attr:`RETRY_ERRORS` or whose code is listed in
+      :attr:`RETRY_CODES`.
+    * The delay grows exponentially (``delay * backoff ** n``, but never more
+      than ``max_delay``) and is randomised between 0 and this value ("full
+      jitter"), so that clients which failed at the same time do not retry at
+      the same time again.
+    * No retry is made if it would end after ``deadline`` seconds (counted
+      from the first try) or if the :class:`RetryBudget` is used up.
+
+    ::
+
+        policy = RetryPolicy(tries=4, delay=.5, max_delay=10, deadline=30)
+        api = RetryAPI(locale='de', policy=policy)
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Max number of tries before giving up
+    TRIES = 5
+
+    #: Base delay in seconds
+    DELAY = 1
+
+    #: Between each try the delay will be lengthened by this backoff multiplier
+    BACKOFF = 2
+
+    #: Max delay between two tries in seconds
+    MAX_DELAY = 30
+
+    #: Exceptions (or reasons of :class:`urllib2.URLError`) worth a retry
+    RETRY_EXCEPTIONS = (socket.timeout, socket.error, httplib.HTTPException)
+
+    #: HTTP status codes worth a retry
+    RETRY_STATUS = (500, 502, 503, 504)
+
+    #: Amazon errors worth a retry
+    RETRY_ERRORS = (InternalError, TooManyRequests)
+
+    #: Codes of (unconverted) Amazon errors worth a retry
+    RETRY_CODES = ('InternalError', 'RequestThrottled', 'ServiceUnavailable')
+
+    def __init__(self, tries=None, delay=None, backoff=None, max_delay=None,
+                 deadline=None, budget=DEFAULT_BUDGET, jitter=True):
+        """
+        :param tries: max number of tries (including the first one).
+        :param delay: base delay between tries in seconds.
+        :param backoff: multiplier applied to the delay after each try.
+        :param max_delay: max delay between two tries in seconds.
+        :param deadline: seconds after which no more retries are made.
+        :param budget: :class:`RetryBudget` (shared by all policies by
+          default) or ``None`` for unlimited retries.
+        :param jitter: if ``False``, the delays are not randomised.
+        """
+        if tries is None:
+            tries = self.TRIES
+        if delay is None:
+            delay = self.DELAY
+        if backoff is None:
+            backoff = self.BACKOFF
+        if max_delay is None:
+            max_delay = self.MAX_DELAY
+        self.tries = tries
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.budget = budget
+        self.jitter = jitter
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s tries, %ss * %s) at %s>' % (self.__class__.__name__,
+            self.tries, self.delay, self.backoff, hex(id(self)))
+
+    def retryable(self, error):
+        """
+        Returns ``True`` if the request which raised ``error`` may succeed if
+        it is sent again.
+        """
+        if isinstance(error, urllib2.HTTPError):
+            return error.code in self.RETRY_STATUS
+        if isinstance(error, urllib2.URLError):
+            error = getattr(error, 'reason', None)
+        if isinstance(error, self.RETRY_EXCEPTIONS + self.RETRY_ERRORS):
+            return True
+        return isinstance(error, AWSError) and error.code in self.RETRY_CODES
+
+    def backoff_delay(self, attempt):
+        """
+        Returns the seconds to wait after the ``attempt``-th try has failed.
+        """
+        delay = min(self.delay * self.backoff ** (attempt - 1), self.max_delay)
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Calls ``fn(*args, **kwargs)`` and retries it according to this policy
+        until it returns. The last error is raised if there are no tries left.
+        """
+        return self.call_before(None, fn, *args, **kwargs)
+
+    def call_before(self, until, fn, *args, **kwargs):
+        """
+        Same as :meth:`call` but no retry is made which would end after time
+        ``until`` (e.g. the deadline of an API call) either.
+        """
+        if self.deadline is not None:
+            limit = time.time() + self.deadline
+            if until is None or limit < until:
+                until = limit
+        if self.budget is not None:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                exc_info = sys.exc_info()
+                wait = self._retry_delay(exc_info[1], attempt, until)
+                if wait is None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                del exc_info
+            time.sleep(wait)
+
+    def _retry_delay(self, error, attempt, until):
+        """
+        Returns the seconds to wait before retrying after ``error`` or
+        ``None`` if no retry must be made.
+        """
+        if attempt >= self.tries or not self.retryable(error):
+            return None
+        wait = self.backoff_delay(attempt)
+        if until is not None and time.time() + wait > until:
+            return None
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+        return wait
+
 
 class RetryAPI (API):
 
     """
     API which will try up to ``TRIES`` times to fetch a result from Amazon
-    should it run into a timeout. For the time being this will remain in
+    should it run into a temporary problem (a timeout, an internal error or a
+    throttled request). What is retried and when is decided by a
+    :class:`RetryPolicy`. For the time being this will remain in
     :mod:`amazonproduct.contrib` but its functionality may be merged into the
     main API at a later date.
 
@@ -19,34 +263,39 @@ class RetryAPI (API):
     #: Max number of tries before giving up
     TRIES = 5
 
-    #: Delay between tries in seconds
+    #: Base delay between tries in seconds
     DELAY = 3
 
     #: Between each try the delay will be lengthened by this backoff multiplier
-    BACKOFF = 1
+    BACKOFF = 2
 
-    def _fetch(self, url):
-        """
-        Retrieves XML response from Amazon. In case of a timeout, it will try
-        :const:`~RetryAPI.TRIES`` times before raising an error.
-        """
-        attempts = 0
-        delay = self.DELAY
+    #: Max delay between two tries in seconds
+    MAX_DELAY = 30
 
-        while True:
-            try:
-                attempts += 1
-                return API._fetch(self, url)
-            except urllib2.URLError, e:
+    #: Seconds after which no more retries are made (``None`` = no deadline)
+    DEADLINE = None
 
-                # if a timeout occurred
-                # wait for some time before trying again
-                reason = getattr(e, 'reason', None)
-                if isinstance(reason, socket.timeout) and attempts < self.TRIES:
-                    time.sleep(delay)
-                    delay *= self.BACKOFF
-                    continue
+    def __init__(self, *args, **kwargs):
+        """
+        :param policy: :class:`RetryPolicy` to use. If omitted, one is created
+          from :attr:`TRIES`, :attr:`DELAY`, :attr:`BACKOFF`,
+          :attr:`MAX_DELAY` and :attr:`DEADLINE`.
 
-                # otherwise reraise the original error
-                raise
+        .. versionchanged:: 0.2.9
+           Parameter ``policy`` was added.
+        """
+        policy = kwargs.pop('policy', None)
+        API.__init__(self, *args, **kwargs)
+        if policy is None:
+            policy = RetryPolicy(self.TRIES, self.DELAY, self.BACKOFF,
+                                 self.MAX_DELAY, self.DEADLINE)
+        self.policy = policy
 
+    def _request(self, url):
+        """
+        Fetches and parses the response for ``url``. Temporary errors are
+        retried as long as :attr:`policy` (and the deadline of the call)
+        allows it.
+        """
+        return self.policy.call_before(
+            self._deadline(), API._request, self, url)
@@ -10,6 +10,7 @@ __all__ = [
     'AccountLimitExceeded', 'AWSError', 'CartInfoMismatch', 'DEFAULT_ERROR_REGS',
     'InvalidClientTokenId', 'InvalidSignature', 'InvalidAccount', 'MissingClientTokenId', 'MissingParameters',
     'ParameterOutOfRange', 'DeprecatedOperation', 'InternalError',
+    'CircuitOpen', 'DeadlineExceeded', 'ExceededMaxBatchRequestsPerOperation',
     'InvalidCartId', 'InvalidCartItem', 'InvalidListType', 'InvalidOperation',
     'InvalidParameterCombination', 'InvalidParameterValue',
     'InvalidResponseGroup', 'InvalidSearchIndex', 'ItemAlreadyInCart',
@@ -197,6 +198,23 @@ class AccountLimitExceeded (AWSError):
     Account limit of 2000 requests per hour exceeded.
     """
 
+class ExceededMaxBatchRequestsPerOperation (AWSError):
+    """
+    You have exceeded the maximum number of batch requests per operation. Each
+    operation may include no more than 2 batch requests.
+    """
+
+class CircuitOpen (AWSError):
+    """
+    Requests to this host are refused for the time being because too many of
+    them failed recently (see :class:`amazonproduct.breaker.CircuitBreaker`).
+    """
+
+class DeadlineExceeded (AWSError):
+    """
+    The call could not be completed before its deadline.
+    """
+
 DEFAULT_ERROR_REGS = {
     'invalid-value' : re.compile(
         'The value you specified for (?P<parameter>\w+) is invalid.'),
@@ -265,9 +283,10 @@ JAPANESE_ERROR_REGS = {
 def _e(error_class, *args, **kwargs):
     """
     Returns an exception of type ``error_class`` based on an instance of
-    :class:`AWSError`  all relevant information appended.
+    :class:`AWSError`  all relevant information appended. The instance is
+    either passed as ``error`` or the exception currently being handled.
     """
-    exc = sys.exc_info()[1]
+    exc = kwargs.pop('error', None) or sys.exc_info()[1]
     error = error_class(*args)
     error.msg = exc.msg
     error.code = exc.code
@@ -0,0 +1,164 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Hedged requests: if Amazon has not answered a read-only request within the
+time most requests take, the same request is sent once more and whichever
+response arrives first is used. This cuts off the long tail of slow responses
+at the cost of a few additional requests.
+"""
+
+import collections
+import math
+import threading
+import time
+
+from amazonproduct.workers import TimeoutError, WorkerPool
+
+
+class Hedger (object):
+
+    """
+    Sends a duplicate request if the first one has not been answered after
+    the ``percentile``-th percentile of the latencies of the last ``window``
+    requests (or after ``delay`` seconds as long as there are fewer than
+    ``min_samples`` of them). ::
+
+        api = API(locale='de', hedge=Hedger(percentile=95))
+
+    Only idempotent operations (see :attr:`OPERATIONS`) are hedged. Both
+    requests are sent by a pool of worker threads. The latencies and the
+    hedge delay are measured from the moment the rate limiter of the API has
+    let a request through, and the duplicate is only sent if the rate limiter
+    has a slot for it right away. The request which loses is cancelled if it
+    has not been started yet; otherwise its response is discarded.
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Operations which may be hedged (cart operations must never be!)
+    OPERATIONS = ('ItemLookup', 'BrowseNodeLookup', 'SimilarityLookup')
+
+    #: Latency percentile after which a duplicate request is sent
+    PERCENTILE = 95
+
+    #: Number of most recent latencies taken into account
+    WINDOW = 100
+
+    #: Number of latencies needed before the percentile is used
+    MIN_SAMPLES = 20
+
+    #: Seconds after which a duplicate request is sent while there are fewer
+    #: than :attr:`MIN_SAMPLES` latencies
+    DELAY = 1.0
+
+    #: Number of worker threads sending requests
+    WORKERS = 16
+
+    def __init__(self, percentile=None, window=None, min_samples=None,
+                 delay=None, operations=None, workers=None):
+        """
+        :param percentile: latency percentile (0-100) after which a
+          duplicate request is sent.
+        :param window: number of most recent latencies taken into account.
+        :param min_samples: number of latencies needed before the percentile
+          is used.
+        :param delay: seconds to wait before sending a duplicate request as
+          long as there are not enough latencies.
+        :param operations: operations which may be hedged.
+        :param workers: number of worker threads or a
+          :class:`~amazonproduct.workers.WorkerPool`.
+        """
+        self.percentile = percentile or self.PERCENTILE
+        self.min_samples = min_samples or self.MIN_SAMPLES
+        if delay is None:
+            delay = self.DELAY
+        self.delay = delay
+        if operations is None:
+            operations = self.OPERATIONS
+        if [op for op in operations if op.startswith('Cart')]:
+            raise ValueError('Cart operations must not be hedged!')
+        self.operations = tuple(operations)
+        if not isinstance(workers, WorkerPool):
+            workers = WorkerPool(workers or self.WORKERS)
+        self.workers = workers
+        self.hedged = 0  # number of duplicate requests sent
+        self.window = window or self.WINDOW
+        self._latencies = collections.deque()
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(p%s) at %s>' % (
+            self.__class__.__name__, self.percentile, hex(id(self)))
+
+    def record(self, latency):
+        """
+        Adds the ``latency`` of a request (in seconds).
+        """
+        self._lock.acquire()
+        try:
+            self._latencies.append(latency)
+            if len(self._latencies) > self.window:
+                self._latencies.popleft()
+        finally:
+            self._lock.release()
+
+    def hedge_delay(self):
+        """
+        Returns the number of seconds after which a duplicate request is
+        sent.
+        """
+        self._lock.acquire()
+        try:
+            latencies = sorted(self._latencies)
+        finally:
+            self._lock.release()
+        if len(latencies) < self.min_samples:
+            return self.delay
+        index = int(math.ceil(self.percentile / 100.0 * len(latencies))) - 1
+        return latencies[max(index, 0)]
+
+    def _timed(self, fn, *args):
+        start = time.time()
+        result = fn(*args)
+        self.record(time.time() - start)
+        return result
+
+    def request(self, fn, args=(), admit=None):
+        """
+        Returns the result of ``fn(*args)`` which sends a request (right away,
+        i.e. after the rate limiter has let it through). If it has not
+        returned after :meth:`hedge_delay` seconds, it is called a second
+        time -- unless the first call has not been started yet or ``admit()``
+        returns ``False`` -- and the first result wins. An error is only
+        raised if both calls fail (in which case it is the one of the first
+        call).
+        """
+        first = self.workers.submit(self._timed, fn, *args)
+        try:
+            return first.result(self.hedge_delay())
+        except TimeoutError:
+            pass
+        if not first.running() or (admit is not None and not admit()):
+            # never hedge a request which is still waiting for a worker
+            return first.result()
+
+        self._lock.acquire()
+        self.hedged += 1
+        self._lock.release()
+        second = self.workers.submit(self._timed, fn, *args)
+
+        done = threading.Event()
+        first.add_done_callback(lambda future: done.set())
+        second.add_done_callback(lambda future: done.set())
+        while True:
+            done.wait()
+            done.clear()
+            for future, other in ((first, second), (second, first)):
+                if future.done() and future.exception() is None:
+                    other.cancel()
+                    return future.result()
+            if first.done() and second.done():
+                return first.result()
@@ -1,4 +1,9 @@
 
+import time
+
+from amazonproduct.utils import ClosingIterator, LRUCache
+from amazonproduct.workers import WorkerPool
+
 # paginator types
 ITEMS_PAGINATOR = 'ItemPage'
 RELATEDITEMS_PAGINATOR = 'RelatedItemPage'
@@ -17,6 +22,11 @@ class BaseProcessor (object):
     #: appropriate subclass of :class:`BaseResultPaginator`
     paginators = {}
 
+    #: ``False`` if a parsed result can be used only once (e.g. because it is
+    #: parsed while it is iterated over). Such results can neither be copied
+    #: nor shared by several callers.
+    reusable = True
+
     def parse(self, fp):
         """
         Parses a file-like XML source returned from Amazon. This is the most
@@ -65,6 +75,22 @@ class BaseResultPaginator (object):
 
     ``current``
         Number of result page retrieved last.
+
+    Pages are fetched one after another as you iterate over them unless you
+    pass ``prefetch=<n>`` in which case up to ``n`` following pages are
+    requested concurrently (still within the API's rate limit) while the
+    current page is being processed. Pages are always returned in order.
+
+    Parsed pages are cached so that iterating over a paginator a second time
+    does not send any requests. To limit the memory used, pass
+    ``cache_size=<n>`` (max number of pages kept) and/or ``cache_bytes=<n>``
+    (approximate number of bytes kept), the least recently used pages are
+    evicted first. With ``streaming=True`` no pages are kept once they have
+    been returned by :meth:`iterpages` (and thereby ``__iter__``), so iterating
+    over all items uses constant memory.
+
+    A ``deadline=<seconds>`` applies to all pages together (counted from the
+    creation of the paginator) rather than to each page.
     """
 
     #: Default pagination limit imposed by Amazon.
@@ -73,6 +99,9 @@ class BaseResultPaginator (object):
     counter = None
     items = None
 
+    #: Drop pages once they have been iterated over (see above).
+    streaming = False
+
     def __init__(self, fun, *args, **kwargs):
         """
         :param fun: original API method which will be called repeatedly with
@@ -81,8 +110,14 @@ class BaseResultPaginator (object):
         self.fun = fun
         self.args, self.kwargs = args, kwargs
         self.limit = kwargs.pop('limit', self.LIMIT)
+        self.prefetch = kwargs.pop('prefetch', 0)
+        self.deadline = None  # time by which all pages must be fetched
+        if kwargs.get('deadline') is not None:
+            self.deadline = time.time() + kwargs.pop('deadline')
 
-        self._pagecache = {}
+        self.streaming = kwargs.pop('streaming', self.streaming)
+        self._pagecache = LRUCache(kwargs.pop('cache_size', None),
+            kwargs.pop('cache_bytes', None), sizeof=_approximate_size)
 
         # fetch first page to get pagination parameters
         self.page(kwargs.get(self.counter, 1))
@@ -113,25 +148,75 @@ class BaseResultPaginator (object):
         """
         Fetch single page from results.
         """
-        self.kwargs[self.counter] = index
-        # use cached page if found
-        if index in self._pagecache:
-            root = self._pagecache[index]
-        else:
-            root = self.fun(*self.args, **self.kwargs)
-            self._pagecache[index] = root
+        root = self._fetch_page(index)
         self.current, self.pages, self.results = self.paginator_data(root)
         return root
 
+    def _fetch_page(self, index):
+        """
+        Returns page ``index`` from the cache or from Amazon. This does not
+        change any attributes except for the cache, so pages may be fetched
+        from several threads at once.
+        """
+        # use cached page if found
+        root = self._pagecache.get(index)
+        if root is not None:
+            return root
+        kwargs = dict(self.kwargs)
+        kwargs[self.counter] = index
+        if self.deadline is not None:
+            kwargs['deadline'] = self.deadline - time.time()
+        root = self.fun(*self.args, **kwargs)
+        self._pagecache[index] = root
+        return root
+
     def iterpages(self):
         """
         Iterates over all pages. Keep in mind that Amazon limits the number of
         pages it makes available, although attribute ``pages`` may say
         otherwise!
         """
-        yield self.page(1)
+        yield self._yielded(self.page(1))
+        if self.prefetch:
+            for root in self._prefetch_pages():
+                yield self._yielded(root)
+            return
         while self.pages > self.current < self.limit:
-            yield self.page(self.current + 1)
+            yield self._yielded(self.page(self.current + 1))
+
+    def _yielded(self, root):
+        """
+        Returns ``root`` after dropping it from the cache in streaming mode.
+        """
+        if self.streaming:
+            self._pagecache.pop(self.current)
+        return root
+
+    def _prefetch_pages(self):
+        """
+        Iterates over all pages after the current one while up to
+        :attr:`prefetch` pages ahead are fetched concurrently. The worker
+        threads are stopped as soon as the iteration ends.
+        """
+        workers = WorkerPool(self.prefetch)
+        futures = {}
+        def cleanup():
+            # don't waste requests on pages nobody is interested in anymore
+            for future in futures.values():
+                future.cancel()
+            workers.shutdown(wait=False)
+        return ClosingIterator(self._prefetched(workers, futures), cleanup)
+
+    def _prefetched(self, workers, futures):
+        while self.pages > self.current < self.limit:
+            index = self.current + 1
+            last = min(index + self.prefetch, len(self))
+            for ahead in range(index, last + 1):
+                if ahead not in futures:
+                    futures[ahead] = workers.submit(self._fetch_page, ahead)
+            root = futures.pop(index).result()
+            self.current, self.pages, self.results = self.paginator_data(root)
+            yield root
 
     def paginator_data(self, node):
         """
@@ -153,3 +238,20 @@ class BaseResultPaginator (object):
         Returns iterable over XML item nodes.
         """
         raise NotImplementedError # pragma: no cover
+
+
+def _approximate_size(node):
+    """
+    Estimates the number of bytes an (ElementTree-like) XML node takes up
+    from the length of its tags, attributes and texts.
+    """
+    # Element.iter() is only available from Python 2.7 onward!
+    iterate = getattr(node, 'iter', None) or node.getiterator
+    size = 0
+    for element in iterate():
+        if isinstance(element.tag, basestring):  # skip comments etc.
+            size += len(element.tag)
+        size += 64 + len(element.text or '') + len(element.tail or '')
+        for key, value in element.items():
+            size += len(key) + len(value)
+    return size
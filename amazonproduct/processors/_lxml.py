@@ -3,14 +3,41 @@
 XPath based paginators for lxml.etree and lxml.objectify based processors.
 """
 
+from lxml import etree
+
 from amazonproduct.processors import BaseResultPaginator
 
 
+#: Compiled XPath expressions by ``(expression, namespace)``
+_XPATHS = {}
+
+
+def compile_xpath(expr, nspace):
+    """
+    Returns ``expr`` compiled as :class:`lxml.etree.XPath` for documents using
+    default namespace ``nspace`` (which is bound to prefix ``aws``). Each
+    expression is compiled only once per namespace. Compiled expressions
+    serialise their evaluation, so they may be shared between threads.
+    """
+    key = (expr, nspace)
+    try:
+        return _XPATHS[key]
+    except KeyError:
+        pass
+    if nspace:
+        xpath = etree.XPath(expr, namespaces={'aws': nspace})
+    else:
+        # lxml does not allow an empty namespace for a prefix
+        xpath = etree.XPath(expr.replace('aws:', ''))
+    return _XPATHS.setdefault(key, xpath)
+
+
 class XPathPaginator (BaseResultPaginator):
 
     """
     Result paginator using XPath expressions to extract page and result
-    information from XML.
+    information from XML. All paths are anchored at the document root (rather
+    than searching the whole document with ``//``) and compiled only once.
     """
 
     counter = current_page_xpath = total_pages_xpath = total_results_xpath = None
@@ -19,7 +46,7 @@ class XPathPaginator (BaseResultPaginator):
         nspace = root.nsmap.get(None, '')
         def fetch_value(xpath, default):
             try:
-                node = root.xpath(xpath, namespaces={'aws': nspace})[0]
+                node = compile_xpath(xpath, nspace)(root)[0]
                 return int(node.text)
             except (IndexError, ValueError):
                 return default
@@ -31,16 +58,16 @@ class XPathPaginator (BaseResultPaginator):
 
     def iterate(self, root):
         nspace = root.nsmap.get(None, '')
-        return root.xpath(self.items, namespaces={'aws': nspace})
+        return compile_xpath(self.items, nspace)(root)
 
 
 class SearchPaginator (XPathPaginator):
 
     counter = 'ItemPage'
-    current_page_xpath = '//aws:Items/aws:Request/aws:ItemSearchRequest/aws:ItemPage'
-    total_pages_xpath = '//aws:Items/aws:TotalPages'
-    total_results_xpath = '//aws:Items/aws:TotalResults'
-    items = '//aws:Items/aws:Item'
+    current_page_xpath = '/*/aws:Items/aws:Request/aws:ItemSearchRequest/aws:ItemPage'
+    total_pages_xpath = '/*/aws:Items/aws:TotalPages'
+    total_results_xpath = '/*/aws:Items/aws:TotalResults'
+    items = '/*/aws:Items/aws:Item'
 
 
 class RelatedItemsPaginator (XPathPaginator):
@@ -67,9 +94,10 @@ class RelatedItemsPaginator (XPathPaginator):
 
     """
     counter = 'RelatedItemPage'
-    current_page_xpath = '//aws:RelatedItemPage'
-    total_pages_xpath = '//aws:RelatedItems/aws:RelatedItemPageCount'
-    total_results_xpath = '//aws:RelatedItems/aws:RelatedItemCount'
-    items = '//aws:RelatedItems/aws:RelatedItem/aws:Item'
+    current_page_xpath = ('/*/aws:Items/aws:Request/*/aws:RelatedItemPage'
+        ' | /*/aws:Items/aws:Item/aws:RelatedItems/aws:RelatedItemPage')
+    total_pages_xpath = '/*/aws:Items/aws:Item/aws:RelatedItems/aws:RelatedItemPageCount'
+    total_results_xpath = '/*/aws:Items/aws:Item/aws:RelatedItems/aws:RelatedItemCount'
+    items = '/*/aws:Items/aws:Item/aws:RelatedItems/aws:RelatedItem/aws:Item'
 
 
@@ -122,6 +122,14 @@ class Processor (BaseProcessor):
         RELATEDITEMS_PAGINATOR: RelatedItemsPaginator,
     }
 
+    #: Where Amazon puts error messages (either directly below the root or
+    #: with the request they belong to)
+    error_paths = [
+        './{}Error',
+        './*/{}Errors/{}Error',
+        './*/{}Request/{}Errors/{}Error',
+    ]
+
     def __init__(self, *args, **kwargs):
         # processor can be told which etree module to use in order to have
         # multiple processors each using a different implementation
@@ -137,12 +145,12 @@ class Processor (BaseProcessor):
     def parse(self, fp):
         root = self.etree.parse(fp).getroot()
         ns = extract_nspace(root)
-        errors = root.findall('.//%sError' % ns)
-        for error in errors:
-            raise AWSError(
-                code=error.findtext('./%sCode' % ns),
-                msg=error.findtext('./%sMessage' % ns),
-                xml=root)
+        for path in self.error_paths:
+            for error in root.findall(path.replace('{}', ns)):
+                raise AWSError(
+                    code=error.findtext('./%sCode' % ns),
+                    msg=error.findtext('./%sMessage' % ns),
+                    xml=root)
         return root
 
     def __repr__(self): # pragma: no cover
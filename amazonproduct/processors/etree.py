@@ -12,6 +12,7 @@ from amazonproduct.processors import ITEMS_PAGINATOR, RELATEDITEMS_PAGINATOR
 
 from amazonproduct.processors._lxml import SearchPaginator
 from amazonproduct.processors._lxml import RelatedItemsPaginator
+from amazonproduct.processors._lxml import compile_xpath
 
 
 class Processor (BaseProcessor):
@@ -25,10 +26,15 @@ class Processor (BaseProcessor):
         RELATEDITEMS_PAGINATOR: RelatedItemsPaginator,
     }
 
+    #: Where Amazon puts error messages (either directly below the root or
+    #: with the request they belong to)
+    error_xpath = ('/*/aws:Error | /*/*/aws:Errors/aws:Error'
+        ' | /*/*/aws:Request/aws:Errors/aws:Error')
+
     def parse(self, fp):
         root = etree.parse(fp).getroot()
         nspace = {'aws': root.nsmap.get(None, '')}
-        errors = root.xpath('//aws:Error', namespaces=nspace)
+        errors = compile_xpath(self.error_xpath, nspace['aws'])(root)
         for error in errors:
             raise AWSError(
                 code=error.findtext('./aws:Code', namespaces=nspace),
@@ -0,0 +1,143 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Streaming result processor using ``lxml.etree.iterparse``. Rather than
+building the whole document before returning anything, it parses a response
+only up to its first ``Item``. The items themselves are parsed one by one as
+you iterate over the result, so you can start working on them while the rest
+of the page is still being parsed (or even downloaded) and memory usage stays
+proportional to a single item. ::
+
+    api = API(locale='de', processor='amazonproduct.processors.iterparse')
+    for item in api.item_search('Books', Publisher='Galileo Press'):
+        print item.findtext('{*}ItemAttributes/{*}Title')
+
+.. warning:: Each item is cleared as soon as the next one is requested. Copy
+   whatever you need before moving on!
+"""
+
+from lxml import etree
+
+from amazonproduct.errors import AWSError
+from amazonproduct.processors import BaseProcessor, ITEMS_PAGINATOR
+from amazonproduct.processors import etree as etree_processor
+from amazonproduct.processors._lxml import SearchPaginator
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class StreamingResponse (object):
+
+    """
+    Partially parsed response. Attribute ``root`` holds the document (as
+    ``lxml.etree`` element) parsed up to the first item. Iterating over the
+    response parses and yields the items one after another. This can only be
+    done once!
+    """
+
+    def __init__(self, root, events=None, items=None):
+        self.root = root
+        self._events = events
+        self._items = items  # <Items> node (if there are any items at all)
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s %s at %s>' % (
+            self.__class__.__name__, self.root.tag, hex(id(self)))
+
+    def __iter__(self):
+        events, self._events = self._events, None
+        if events is None:
+            return
+        previous = None
+        for event, element in events:
+            if (event == 'end' and element.getparent() is self._items
+            and _localname(element.tag) == 'Item'):
+                if previous is not None:
+                    self._discard(previous)
+                previous = element
+                yield element
+        if previous is not None:
+            self._discard(previous)
+
+    def _discard(self, item):
+        item.clear()
+        self._items.remove(item)
+
+
+class StreamingPaginator (SearchPaginator):
+
+    """
+    Paginator for :class:`StreamingResponse` objects. Since a response can be
+    iterated over only once, pages are not cached (and ``cache_size`` and
+    ``cache_bytes`` are ignored).
+    """
+
+    streaming = True
+
+    def __init__(self, fun, *args, **kwargs):
+        kwargs.pop('cache_size', None)
+        kwargs.pop('cache_bytes', None)
+        SearchPaginator.__init__(self, fun, *args, **kwargs)
+
+    def paginator_data(self, response):
+        return SearchPaginator.paginator_data(self, response.root)
+
+    def iterate(self, response):
+        return iter(response)
+
+
+class Processor (BaseProcessor):
+
+    """
+    Result processor using ``lxml.etree.iterparse`` which returns
+    :class:`StreamingResponse` objects.
+
+    .. note:: Pagination over related items is not supported as the
+       pagination data is hidden inside the items. Calls cannot be coalesced
+       either (see ``API(coalesce=True)``) as each response can be iterated
+       over only once.
+
+    .. versionadded:: 0.2.9
+    """
+
+    paginators = {
+        ITEMS_PAGINATOR: StreamingPaginator,
+    }
+
+    reusable = False
+
+    def parse(self, fp):
+        events = etree.iterparse(fp, events=('start', 'end'))
+        root = None
+        for event, element in events:
+            if root is None:
+                root = element
+            name = _localname(element.tag)
+            if event == 'start':
+                parent = element.getparent()
+                # stop at the first item of <Items>
+                if (name == 'Item' and parent is not None
+                and parent.getparent() is root):
+                    return StreamingResponse(root, events, parent)
+            elif name == 'Error':
+                # parse the rest of the (error) response before raising
+                for _ in events:
+                    pass
+                raise AWSError(
+                    code=element.findtext('./{*}Code'),
+                    msg=element.findtext('./{*}Message'),
+                    xml=root)
+        return StreamingResponse(root)
+
+    @classmethod
+    def parse_cart(cls, node):
+        """
+        Returns an instance of :class:`amazonproduct.contrib.Cart` based on
+        information extracted from ``node``.
+        """
+        return etree_processor.Processor.parse_cart(node.root)
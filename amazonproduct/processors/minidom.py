@@ -9,6 +9,32 @@ from amazonproduct.errors import AWSError
 from amazonproduct.processors import BaseProcessor
 
 
+def _children(node, name):
+    """
+    Returns all child elements of ``node`` with local name ``name``.
+    """
+    return [child for child in node.childNodes
+            if child.nodeType == child.ELEMENT_NODE
+            and child.localName == name]
+
+
+def _find_errors(root):
+    """
+    Yields all ``Error`` elements from the places Amazon puts them: directly
+    below the root element, in ``OperationRequest/Errors`` or in
+    ``<Items>/Request/Errors`` (and its equivalents for carts etc.).
+    """
+    for error in _children(root, 'Error'):
+        yield error
+    for child in root.childNodes:
+        if child.nodeType != child.ELEMENT_NODE:
+            continue
+        for parent in [child] + _children(child, 'Request'):
+            for errors in _children(parent, 'Errors'):
+                for error in _children(errors, 'Error'):
+                    yield error
+
+
 class Processor(BaseProcessor):
 
     """
@@ -19,7 +45,7 @@ class Processor(BaseProcessor):
     def parse(self, fp):
         root = xml.dom.minidom.parse(fp)
         # parse errors
-        for er in root.getElementsByTagName('Error'):
+        for er in _find_errors(root.documentElement):
             raise AWSError(
                 code=er.getElementsByTagName('Code')[0].firstChild.nodeValue,
                 msg=er.getElementsByTagName('Message')[0].firstChild.nodeValue,
@@ -12,6 +12,7 @@ from amazonproduct.processors import ITEMS_PAGINATOR, RELATEDITEMS_PAGINATOR
 
 from amazonproduct.processors._lxml import SearchPaginator
 from amazonproduct.processors._lxml import RelatedItemsPaginator
+from amazonproduct.processors._lxml import compile_xpath
 
 
 class SelectiveClassLookup(etree.CustomElementClassLookup):
@@ -45,6 +46,11 @@ class Processor (BaseProcessor):
         RELATEDITEMS_PAGINATOR: RelatedItemsPaginator,
     }
 
+    #: Where Amazon puts error messages (either directly below the root or
+    #: with the request they belong to)
+    error_xpath = ('/*/aws:Error | /*/*/aws:Errors/aws:Error'
+        ' | /*/*/aws:Request/aws:Errors/aws:Error')
+
     def __init__(self):
         self._parser = etree.XMLParser()
         lookup = SelectiveClassLookup()
@@ -61,11 +67,8 @@ class Processor (BaseProcessor):
         #~ from lxml import etree
         #~ print etree.tostring(tree, pretty_print=True)
 
-        try:
-            nspace = root.nsmap[None]
-            errors = root.xpath('//aws:Error', namespaces={'aws': nspace})
-        except KeyError:
-            errors = root.xpath('//Error')
+        nspace = root.nsmap.get(None, '')
+        errors = compile_xpath(self.error_xpath, nspace)(root)
 
         for error in errors:
             raise AWSError(
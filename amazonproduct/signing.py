@@ -0,0 +1,125 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Signing of request URLs (see
+http://docs.aws.amazon.com/AWSECommerceService/latest/DG/RequestAuthenticationArticle.html).
+"""
+
+from base64 import b64encode
+import hmac
+import sys
+import time
+
+# For historic reasons, this module also supports Python 2.4. To make this
+# happen, a few things have to be imported differently, e.g. pycrypto is needed
+# to create URL signatures.
+if sys.version_info[:2] > (2, 4): # pragma: no cover
+    from urllib2 import quote
+    from hashlib import sha256 # pylint: disable-msg=E0611
+else:
+    from urllib import quote
+    from Crypto.Hash import SHA256 as sha256
+
+
+def encode(value):
+    """
+    Returns ``value`` URL encoded as required for the signature. Lists (e.g.
+    of response groups) are joined by commas.
+    """
+    if isinstance(value, list):
+        value = ','.join(value)
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = unicode(value).encode('utf-8')
+    return quote(value, safe='~')
+
+
+class Signer (object):
+
+    """
+    Creates signed request URLs for one host and one set of credentials. The
+    work which is the same for every request is done only once: the HMAC key
+    is hashed up front (each signature starts from a copy) and the parameters
+    which are sent with every request are encoded and sorted in advance, so
+    only the parameters of the request itself have to be encoded and merged
+    in. ::
+
+        signer = Signer('ecs.amazonaws.de', access_key, secret_key,
+                        constants={'Service': 'AWSECommerceService'})
+        url = signer.sign({'Operation': 'ItemLookup', 'ItemId': '0201896834'})
+
+    Parameters passed to :meth:`sign` take precedence over the constant ones.
+
+    .. versionadded:: 0.2.9
+    """
+
+    path = '/onca/xml'
+
+    def __init__(self, host, access_key, secret_key, constants=None):
+        """
+        :param host: host the requests are sent to.
+        :param access_key: AWS access key ID.
+        :param secret_key: AWS secret key.
+        :param constants: dict of parameters sent with every request (those
+          which are ``None`` are skipped).
+        """
+        self.host = host
+        self.access_key = access_key
+        constants = [(key, encode(value))
+                     for key, value in (constants or {}).items()
+                     if value is not None]
+        constants.append(('AWSAccessKeyId', encode(access_key)))
+        constants.sort()
+        self._constants = constants
+        self._hmac = hmac.new(secret_key or '', digestmod=sha256)
+        self._prefix = 'GET\n%s\n%s\n' % (host, self.path)
+        self._url = 'http://%s%s?' % (host, self.path)
+        self._timestamp = (None, None)  # (second, formatted timestamp)
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s, %s) at %s>' % (self.__class__.__name__,
+            self.host, self.access_key, hex(id(self)))
+
+    def timestamp(self):
+        """
+        Returns the current time as required for parameter ``Timestamp``.
+        """
+        now = int(time.time())
+        second, timestamp = self._timestamp
+        if second != now:
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))
+            self._timestamp = (now, timestamp)
+        return timestamp
+
+    def sign(self, params, timestamp=None):
+        """
+        Returns the signed URL for the request with ``params`` (a dict whose
+        ``None`` values are skipped). Lists of response groups are joined.
+        """
+        params = [(key, encode(value)) for key, value in params.items()
+                  if value is not None and key != 'Timestamp']
+        params.append(('Timestamp', encode(timestamp or self.timestamp())))
+        params.sort()
+        keys = set(key for key, _ in params)
+        # both lists are sorted already, so sorting them together is a
+        # simple merge
+        params = [item for item in self._constants
+                  if item[0] not in keys] + params
+        params.sort()
+        args = '&'.join('%s=%s' % item for item in params)
+        digest = self._hmac.copy()
+        digest.update(self._prefix + args)
+        return '%s%s&Signature=%s' % (
+            self._url, args, quote(b64encode(digest.digest())))
+
+    def sign_many(self, requests):
+        """
+        Returns the signed URLs for a sequence of parameter dicts. All of them
+        share the same timestamp.
+        """
+        timestamp = self.timestamp()
+        return [self.sign(params, timestamp) for params in requests]
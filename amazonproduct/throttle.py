@@ -0,0 +1,225 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+Rate limiters which keep requests within the limits Amazon imposes on an
+account (see :attr:`amazonproduct.api.API.REQUESTS_PER_SECOND`).
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # not available on Windows
+
+
+class TokenBucket (object):
+
+    """
+    Thread-safe token bucket which allows ``rate`` requests per second on
+    average and up to ``burst`` requests in a row after a quiet period. It can
+    be shared by any number of threads and :class:`~amazonproduct.api.API`
+    instances (e.g. all those using the same credentials)::
+
+        limiter = TokenBucket(rate=1, burst=1)
+        api_de = API(locale='de', limiter=limiter)
+        api_uk = API(locale='uk', limiter=limiter)
+
+    Each caller reserves its slot while holding the lock and sleeps afterwards,
+    so waiting callers are released in the order they arrived (FIFO).
+
+    .. versionadded:: 0.2.9
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        :param rate: requests per second (may be a float, e.g. ``2000/3600.``)
+        :param burst: max number of requests which may be sent at once.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        # time at which the bucket would be full again (i.e. the "theoretical
+        # arrival time" of the generic cell rate algorithm)
+        self._tat = 0.0
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s/s, burst=%s) at %s>' % (
+            self.__class__.__name__, self.rate, self.burst, hex(id(self)))
+
+    def reserve(self, timeout=None):
+        """
+        Takes the next available token and returns the number of seconds the
+        caller has to wait before it may use it. If that would be more than
+        ``timeout`` seconds, no token is taken and ``None`` is returned.
+        """
+        self._lock.acquire()
+        try:
+            tat, wait = self._take(self._tat, time.time())
+            if timeout is not None and wait > timeout:
+                return None
+            self._tat = tat
+            return wait
+        finally:
+            self._lock.release()
+
+    def _take(self, tat, now):
+        """
+        Takes a token at time ``now`` from a bucket which would be full at
+        ``tat``. Returns the new ``tat`` and the seconds to wait.
+        """
+        interval = 1.0 / self.rate
+        tat = max(tat, now)
+        return tat + interval, max(tat - (self.burst - 1) * interval - now, 0)
+
+    def acquire(self, timeout=None):
+        """
+        Blocks until the caller may send its request and returns ``True``.
+        If this would take longer than ``timeout`` seconds, ``False`` is
+        returned right away (without wasting a token).
+        """
+        wait = self.reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def success(self):
+        """
+        Called after each request which was not throttled by Amazon.
+        """
+
+    def throttled(self):
+        """
+        Called whenever Amazon has throttled a request (i.e. answered with
+        :class:`~amazonproduct.errors.TooManyRequests`). Returns ``True`` if
+        the request should be retried.
+        """
+        return False
+
+
+class AdaptiveTokenBucket (TokenBucket):
+
+    """
+    Token bucket which finds out the highest rate Amazon allows for an account
+    (which grows with its revenue) by itself: The rate is raised by
+    ``increase`` after each successful request and cut by ``decrease`` (i.e.
+    additive increase/multiplicative decrease) whenever a request is
+    throttled. Throttled requests are retried transparently::
+
+        limiter = AdaptiveTokenBucket(rate=1, max_rate=10)
+        api = API(locale='de', limiter=limiter)
+
+    .. versionadded:: 0.2.9
+    """
+
+    def __init__(self, rate=1, burst=1, min_rate=.1, max_rate=10,
+                 increase=.05, decrease=.5):
+        """
+        :param rate: initial requests per second.
+        :param burst: max number of requests which may be sent at once.
+        :param min_rate: the rate is never cut below this value.
+        :param max_rate: the rate is never raised above this value.
+        :param increase: requests per second added after each success.
+        :param decrease: factor applied to the rate when throttled.
+        """
+        TokenBucket.__init__(self, rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+
+    def success(self):
+        self._lock.acquire()
+        try:
+            self.rate = min(self.rate + self.increase, self.max_rate)
+        finally:
+            self._lock.release()
+
+    def throttled(self):
+        self._lock.acquire()
+        try:
+            self.rate = max(self.rate * self.decrease, self.min_rate)
+        finally:
+            self._lock.release()
+        return True
+
+
+class SharedTokenBucket (TokenBucket):
+
+    """
+    Token bucket whose state is kept in a memory-mapped file so that it is
+    shared by all processes using the same ``path`` (e.g. several workers
+    using one Associate account). Access is serialised with ``fcntl`` locks,
+    so no external service is required::
+
+        limiter = SharedTokenBucket('/var/tmp/amazon-product-api.limit', rate=1)
+        api = API(locale='de', limiter=limiter)
+
+    .. note:: Only available on Unix systems.
+
+    .. versionadded:: 0.2.9
+    """
+
+    _format = 'd'
+    _size = struct.calcsize(_format)
+
+    def __init__(self, path, rate, burst=1):
+        """
+        :param path: file holding the shared state (created if missing).
+        :param rate: requests per second for all processes together.
+        :param burst: max number of requests which may be sent at once.
+        """
+        if fcntl is None:  # pragma: no cover
+            raise ImportError('SharedTokenBucket requires module fcntl!')
+        TokenBucket.__init__(self, rate, burst)
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < self._size:
+                    os.ftruncate(fd, self._size)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, self._size)
+        except:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%s, %s/s, burst=%s) at %s>' % (self.__class__.__name__,
+            self.path, self.rate, self.burst, hex(id(self)))
+
+    def reserve(self, timeout=None):
+        # fcntl locks are held per process, so threads still need the lock
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                tat = struct.unpack(self._format, self._map[:])[0]
+                tat, wait = self._take(tat, time.time())
+                if timeout is not None and wait > timeout:
+                    return None
+                self._map[:] = struct.pack(self._format, tat)
+                return wait
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Closes the state file.
+        """
+        self._map.close()
+        os.close(self._fd)
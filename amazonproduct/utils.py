@@ -6,6 +6,7 @@
 from ConfigParser import SafeConfigParser
 import os
 import sys
+import threading
 
 REQUIRED_KEYS = [
     'access_key',
@@ -157,3 +158,148 @@ def load_class(name):
     module_name, class_name = name.rsplit('.', 1)
     module = import_module(module_name)
     return getattr(module, class_name)
+
+
+class LRUCache (object):
+
+    """
+    Thread-safe dictionary-like cache which evicts the least recently used
+    entries as soon as it holds more than ``maxsize`` entries or (if a
+    ``maxbytes`` budget is set) more than ``maxbytes`` bytes as calculated by
+    ``sizeof(value)``. Either limit may be ``None`` (unlimited).
+
+    Numbers of ``hits``, ``misses`` and ``evictions`` are recorded.
+    """
+
+    def __init__(self, maxsize=None, maxbytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.size = 0  # bytes currently held (if maxbytes is set)
+        self.hits = self.misses = self.evictions = 0
+        # The entries are kept in a circular doubly linked list (from least
+        # to most recently used) of [prev, next, key, value, size] links
+        # (collections.OrderedDict is only available from Python 2.7 onward).
+        self._data = {}  # key -> link
+        self._root = root = []
+        root[:] = [root, root, None, None, 0]
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s %i entries, %i bytes at %s>' % (
+            self.__class__.__name__, len(self), self.size, hex(id(self)))
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def _unlink(self, link):
+        link[0][1], link[1][0] = link[1], link[0]
+
+    def _append(self, link):
+        last = self._root[0]
+        link[0], link[1] = last, self._root
+        last[1] = self._root[0] = link
+
+    def get(self, key, default=None):
+        """
+        Returns the value for ``key`` (marking it as recently used) or
+        ``default``.
+        """
+        self._lock.acquire()
+        try:
+            link = self._data.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self._unlink(link)
+            self._append(link)
+            self.hits += 1
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        size = 0
+        if self.maxbytes is not None:
+            size = self.sizeof(value)
+        self._lock.acquire()
+        try:
+            self._remove(key)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return  # would not fit anyway
+            link = self._data[key] = [None, None, key, value, size]
+            self._append(link)
+            self.size += size
+            while ((self.maxsize is not None and len(self._data) > self.maxsize)
+            or (self.maxbytes is not None and self.size > self.maxbytes)):
+                self._remove(self._root[1][2])
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def _remove(self, key):
+        """
+        Removes ``key`` (if present) and returns its link.
+        """
+        link = self._data.pop(key, None)
+        if link is not None:
+            self._unlink(link)
+            self.size -= link[4]
+        return link
+
+    def pop(self, key, default=None):
+        """
+        Removes ``key`` and returns its value (or ``default``).
+        """
+        self._lock.acquire()
+        try:
+            link = self._remove(key)
+            if link is None:
+                return default
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._data.clear()
+            self._root[:] = [self._root, self._root, None, None, 0]
+            self.size = 0
+        finally:
+            self._lock.release()
+
+
+class ClosingIterator (object):
+
+    """
+    Iterates over ``iterable`` and calls ``cleanup()`` as soon as it is
+    exhausted, raises an error, is closed or is garbage collected, whichever
+    comes first. Generators cannot do this themselves before Python 2.5
+    (``yield`` is not allowed inside ``try ... finally``).
+    """
+
+    def __init__(self, iterable, cleanup):
+        self._iterator = iter(iterable)
+        self._cleanup = cleanup
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return self._iterator.next()
+        except:
+            exc_info = sys.exc_info()
+            self.close()
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def close(self):
+        cleanup, self._cleanup = self._cleanup, None
+        if cleanup is not None:
+            cleanup()
+
+    __del__ = close
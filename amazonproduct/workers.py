@@ -0,0 +1,254 @@
+# Copyright (C) 2009-2013 Sebastian Rahlf <basti at redtoad dot de>
+#
+# This program is release under the BSD License. You can find the full text of
+# the license in the LICENSE file.
+
+"""
+A minimal thread pool returning futures (Python 2 has neither
+:mod:`concurrent.futures` nor :mod:`asyncio`). It is used wherever requests to
+Amazon are sent concurrently.
+"""
+
+import Queue
+import sys
+import threading
+
+
+class TimeoutError (Exception):
+    """
+    The result of a :class:`Future` was not available in time.
+    """
+
+
+class CancelledError (Exception):
+    """
+    The :class:`Future` was cancelled before it was run.
+    """
+
+
+class Future (object):
+
+    """
+    Result of a call which is executed asynchronously. Use :meth:`result` to
+    wait for the return value. Should the call have raised an exception, it is
+    raised again (with its original traceback).
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = self._cancelled = self._running = False
+        self._result = self._exc_info = None
+        self._callbacks = []
+
+    def __repr__(self):  # pragma: no cover
+        state = 'pending'
+        if self._cancelled:
+            state = 'cancelled'
+        elif self._done:
+            state = 'finished'
+        elif self._running:
+            state = 'running'
+        return '<Future %s at %s>' % (state, hex(id(self)))
+
+    def done(self):
+        """
+        Returns ``True`` if the call has finished or was cancelled.
+        """
+        return self._done
+
+    def running(self):
+        """
+        Returns ``True`` if the call is being executed right now.
+        """
+        return self._running
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """
+        Cancels the call unless it is already running. Returns ``True`` if
+        the call was cancelled.
+        """
+        self._condition.acquire()
+        try:
+            if self._running or self._done:
+                return self._cancelled
+            self._cancelled = True
+        finally:
+            self._condition.release()
+        self._finish()
+        return True
+
+    def set_running(self):
+        """
+        Marks the future as running. Returns ``False`` if it has been cancelled
+        in which case the call should not be executed.
+        """
+        self._condition.acquire()
+        try:
+            if self._cancelled:
+                return False
+            self._running = True
+            return True
+        finally:
+            self._condition.release()
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exc_info=None):
+        """
+        Stores an exception as the outcome of the call. ``exc_info`` is a
+        tuple as returned by :func:`sys.exc_info` (which is used if omitted).
+        """
+        self._exc_info = exc_info or sys.exc_info()
+        self._finish()
+
+    def _finish(self):
+        self._condition.acquire()
+        try:
+            self._done = True
+            self._running = False
+            self._condition.notifyAll()
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._condition.release()
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, fn):
+        """
+        Calls ``fn(future)`` as soon as the future is done (immediately if it
+        already is).
+        """
+        self._condition.acquire()
+        try:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._condition.release()
+        fn(self)
+
+    def _wait(self, timeout):
+        self._condition.acquire()
+        try:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise TimeoutError
+        finally:
+            self._condition.release()
+        if self._cancelled:
+            raise CancelledError
+
+    def exception(self, timeout=None):
+        """
+        Waits up to ``timeout`` seconds for the call to finish and returns the
+        exception it raised (or ``None``).
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+
+    def result(self, timeout=None):
+        """
+        Waits up to ``timeout`` seconds for the call to finish and returns its
+        result. :class:`TimeoutError` is raised if it has not finished by
+        then.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class WorkerPool (object):
+
+    """
+    Executes calls in a fixed number of (daemon) worker threads which are
+    started on demand. ::
+
+        pool = WorkerPool(4)
+        future = pool.submit(api.item_lookup, '0201896834')
+        root = future.result()
+
+    .. versionadded:: 0.2.9
+    """
+
+    #: Default number of worker threads
+    SIZE = 8
+
+    def __init__(self, size=None):
+        self.size = size or self.SIZE
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        return '<%s(%i) at %s>' % (
+            self.__class__.__name__, self.size, hex(id(self)))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, fn, args, kwargs = item
+            self._lock.acquire()
+            self._idle -= 1
+            self._lock.release()
+            if future.set_running():
+                try:
+                    result = fn(*args, **kwargs)
+                except:
+                    future.set_exception(sys.exc_info())
+                else:
+                    future.set_result(result)
+            self._lock.acquire()
+            self._idle += 1
+            self._lock.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedules ``fn(*args, **kwargs)`` and returns a :class:`Future`.
+        """
+        future = Future()
+        self._lock.acquire()
+        try:
+            if self._idle <= self._queue.qsize() and len(self._threads) < self.size:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                self._threads.append(thread)
+                self._idle += 1
+                thread.start()
+            self._queue.put((future, fn, args, kwargs))
+        finally:
+            self._lock.release()
+        return future
+
+    def map(self, fn, iterable):
+        """
+        Calls ``fn`` for each element of ``iterable`` concurrently and returns
+        an iterator over the results in the order of ``iterable``.
+        """
+        futures = [self.submit(fn, arg) for arg in iterable]
+        return (future.result() for future in futures)
+
+    def shutdown(self, wait=True):
+        """
+        Stops all worker threads once the pending calls are done.
+        """
+        self._lock.acquire()
+        try:
+            threads, self._threads = self._threads, []
+            for _ in threads:
+                self._queue.put(None)
+        finally:
+            self._lock.release()
+        if wait:
+            for thread in threads:
+                thread.join()
@@ -43,6 +43,7 @@ TESTABLE_PROCESSORS = {
     'objectify': 'amazonproduct.processors.objectify',
     'etree': 'amazonproduct.processors.etree',
     'elementtree': 'amazonproduct.processors.elementtree',
+    'iterparse': 'amazonproduct.processors.iterparse',
 #    'minidom': 'amazonproduct.processors.minidom',
 }
 
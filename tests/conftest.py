@@ -25,8 +25,9 @@ def pytest_addoption(parser):
             'previously cached XML file: one of no (default)|missing|outdated|'
             'all.')
     group._addoption('--processor', action='append', dest='processors',
-        metavar='PROCESSOR', choices=['objectify', 'etree', 'elementtree', 'minidom'],
-        help='Result processor to use: one of objectify|etree|minidom.')
+        metavar='PROCESSOR', choices=['objectify', 'etree', 'elementtree', 'minidom', 'iterparse'],
+        help='Result processor to use: one of objectify|etree|elementtree|'
+            'minidom|iterparse.')
 
 
 def pytest_funcarg__server(request):
@@ -0,0 +1,115 @@
+import re
+import StringIO
+import urlparse
+
+import pytest
+
+from amazonproduct.api import API
+from amazonproduct.errors import ExceededMaxBatchRequestsPerOperation
+from amazonproduct.errors import InvalidParameterValue
+
+from tests.utils import fake_lookup_response
+
+BATCH_ERROR = """<?xml version="1.0" ?>
+<ItemLookupResponse xmlns="http://webservices.amazon.com/AWSECommerceService/2011-08-01">
+  <OperationRequest>
+    <RequestId>00000000-0000-0000-0000-000000000000</RequestId>
+    <Errors>
+      <Error>
+        <Code>AWS.ExceededMaxBatchRequestsPerOperation</Code>
+        <Message>You have exceeded the maximum number of batch requests per operation. Each operation may include no more than 2 batch requests.</Message>
+      </Error>
+    </Errors>
+  </OperationRequest>
+</ItemLookupResponse>"""
+
+
+def fake_batch_response(query):
+    """
+    Returns a synthetic (batch) ItemLookup response for ``query``.
+    """
+    if 'ItemId' in query:
+        return fake_lookup_response(query['ItemId'].split(','))
+    requests = sorted(key for key in query if key.endswith('.ItemId'))
+    if len(requests) > 2:
+        return BATCH_ERROR
+    responses = [fake_lookup_response(query[key].split(','))
+                 for key in requests]
+    items = [re.search('<Items>.*</Items>', xml, re.S).group(0)
+             for xml in responses]
+    return re.sub('<Items>.*</Items>', ''.join(items), responses[0],
+                  flags=re.S)
+
+
+def pytest_funcarg__requested(request):
+    """
+    Replaces ``API._fetch`` with synthetic (batch) ItemLookup responses and
+    returns the list of queries sent.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    requested = []
+    def fetch(self, url):
+        query = dict(urlparse.parse_qsl(urlparse.urlsplit(url)[3]))
+        requested.append(query)
+        return StringIO.StringIO(fake_batch_response(query))
+    monkeypatch.setattr(API, '_fetch', fetch)
+    return requested
+
+
+def pytest_funcarg__api(request):
+    api = API(locale='de')
+    api.REQUESTS_PER_SECOND = 10000
+    return api
+
+
+def test_two_operations_are_sent_at_once(api, requested):
+    with api.batch() as batch:
+        first = batch.item_lookup('A1', 'A2', ResponseGroup='Small')
+        second = batch.item_lookup('B1')
+        assert len(requested) == 1
+    assert [item.ASIN for item in first.result().Item] == ['A1', 'A2']
+    assert [item.ASIN for item in second.result().Item] == ['B1']
+    query = requested[0]
+    assert query['Operation'] == 'ItemLookup'
+    assert query['ItemLookup.1.ItemId'] == 'A1,A2'
+    assert query['ItemLookup.1.ResponseGroup'] == 'Small'
+    assert query['ItemLookup.2.ItemId'] == 'B1'
+
+
+def test_remaining_operation_is_sent_on_flush(api, requested):
+    with api.batch() as batch:
+        futures = [batch.item_lookup('A%i' % i) for i in range(3)]
+        assert len(requested) == 1
+        assert not futures[2].done()
+    assert len(requested) == 2
+    assert requested[1]['ItemId'] == 'A2'
+    assert [future.result().Item.ASIN for future in futures] == \
+        ['A0', 'A1', 'A2']
+
+
+def test_errors_are_reported_per_operation(api, requested):
+    with api.batch() as batch:
+        first = batch.item_lookup('X1')
+        second = batch.item_lookup('B1')
+    e = pytest.raises(InvalidParameterValue, first.result).value
+    assert e.args == ('ItemId', 'X1')
+    assert second.result().Item.ASIN == 'B1'
+
+
+def test_errors_of_whole_batch_are_raised_for_all(api, requested):
+    with api.batch() as batch:
+        first = batch.item_lookup('A1')
+        second = batch.item_lookup('B1')
+        batch.MAX_REQUESTS = 3  # Amazon does not accept this
+        third = batch.item_lookup('C1')
+        fourth = batch.item_lookup('D1')
+        fifth = batch.item_lookup('E1')
+    for future in (third, fourth, fifth):
+        pytest.raises(ExceededMaxBatchRequestsPerOperation, future.result)
+    assert first.result().Item.ASIN == 'A1'
+
+
+def test_exceeded_batch_requests_error(api, requested):
+    pytest.raises(ExceededMaxBatchRequestsPerOperation, api.call,
+                  Operation='ItemLookup', **{'ItemLookup.1.ItemId': 'A',
+                  'ItemLookup.2.ItemId': 'B', 'ItemLookup.3.ItemId': 'C'})
@@ -0,0 +1,174 @@
+import os.path
+import socket
+import StringIO
+import time
+from urllib2 import HTTPError, URLError
+
+import pytest
+
+from tests import XML_TEST_DIR
+from tests.utils import fake_lookup_response
+
+from amazonproduct.api import API
+from amazonproduct.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from amazonproduct.errors import AWSError, CircuitOpen, TooManyRequests
+
+
+def pytest_funcarg__clock(request):
+    """
+    Replaces ``time.time`` with a clock which is advanced by hand.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+class fake_urlopen (object):
+
+    """
+    Replacement for ``API._urlopen`` raising the given errors one after
+    another (and returning a lookup response once there are none left).
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return StringIO.StringIO(fake_lookup_response(['0201896834']))
+
+
+def pytest_funcarg__urlopen(request):
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    urlopen = fake_urlopen()
+    monkeypatch.setattr(API, '_urlopen', urlopen)
+    return urlopen
+
+
+def pytest_funcarg__breaker(request):
+    request.getfuncargvalue('clock')
+    return CircuitBreaker(window=10, min_calls=4, error_rate=.5,
+                          timeout_rate=.25, reset_timeout=30)
+
+
+def timeout():
+    return URLError(socket.timeout('timed out'))
+
+
+def test_opens_on_error_rate(breaker):
+    for outcome in ['success', 'error', 'success']:
+        breaker.after('host', outcome)
+    assert breaker.state('host') == CLOSED
+    breaker.after('host', 'error')
+    assert breaker.state('host') == OPEN
+    pytest.raises(CircuitOpen, breaker.before, 'host')
+
+
+def test_opens_on_timeout_rate(breaker):
+    for outcome in ['success', 'success', 'success', 'timeout']:
+        breaker.after('host', outcome)
+    assert breaker.state('host') == OPEN
+
+
+def test_needs_min_calls(breaker):
+    for _ in range(3):
+        breaker.after('host', 'error')
+    assert breaker.state('host') == CLOSED
+    assert breaker.rates('host') == (1.0, 0.0)
+
+
+def test_hosts_are_independent(breaker):
+    breaker.trip('ecs.amazonaws.jp')
+    breaker.before('ecs.amazonaws.de')
+    assert breaker.states() == {
+        'ecs.amazonaws.jp': OPEN, 'ecs.amazonaws.de': CLOSED}
+
+
+def test_half_open_after_reset_timeout(breaker, clock):
+    breaker.trip('host')
+    clock[0] += 29
+    e = pytest.raises(CircuitOpen, breaker.before, 'host').value
+    assert e.args == ('host', 1)
+    clock[0] += 1
+    assert breaker.state('host') == HALF_OPEN
+    breaker.before('host')
+    # only one trial request is let through
+    pytest.raises(CircuitOpen, breaker.before, 'host')
+
+
+def test_successful_trial_closes(breaker, clock):
+    breaker.trip('host')
+    clock[0] += 30
+    breaker.before('host')
+    breaker.after('host', 'success')
+    assert breaker.state('host') == CLOSED
+    assert breaker.rates('host') == (0.0, 0.0)
+
+
+def test_failed_trial_opens_again(breaker, clock):
+    breaker.trip('host')
+    clock[0] += 30
+    breaker.before('host')
+    breaker.after('host', 'timeout')
+    assert breaker.state('host') == OPEN
+    clock[0] += 29
+    pytest.raises(CircuitOpen, breaker.before, 'host')
+
+
+def test_state_changes_are_reported(clock):
+    changes = []
+    breaker = CircuitBreaker(
+        reset_timeout=30, on_change=lambda *args: changes.append(args))
+    breaker.trip('host')
+    clock[0] += 30
+    breaker.before('host')
+    breaker.after('host', 'success')
+    assert changes == [
+        ('host', CLOSED, OPEN),
+        ('host', OPEN, HALF_OPEN),
+        ('host', HALF_OPEN, CLOSED),
+    ]
+
+
+@pytest.mark.parametrize(('error', 'outcome'), [
+    (timeout(), 'timeout'),
+    (socket.timeout(), 'timeout'),
+    (URLError(socket.error(111, 'Connection refused')), 'error'),
+    (HTTPError('http://example.com', 503, 'Unavailable', {}, None), 'error'),
+    (HTTPError('http://example.com', 400, 'Bad Request', {}, None), 'success'),
+    (AWSError(code='AWS.InvalidParameterValue'), 'success'),
+])
+def test_classify(error, outcome):
+    assert CircuitBreaker().classify(error) == outcome
+
+
+def test_api_fails_fast_while_open(breaker, urlopen):
+    api = API(locale='jp', breaker=breaker)
+    urlopen.errors = [timeout()] * 4
+    for _ in range(4):
+        pytest.raises(URLError, api.item_lookup, '0201896834')
+    assert breaker.state(api.host) == OPEN
+    pytest.raises(CircuitOpen, api.item_lookup, '0201896834')
+    assert urlopen.calls == 4
+
+    # other locales are not affected
+    api_de = API(locale='de', breaker=breaker)
+    api_de.item_lookup('0201896834')
+    assert urlopen.calls == 5
+
+
+def test_throttled_requests_do_not_open_circuit(breaker, urlopen):
+    xml = open(os.path.join(XML_TEST_DIR,
+        'APICalls-fails-for-too-many-requests.xml')).read()
+    api = API(locale='de', breaker=breaker)
+    urlopen.errors = [HTTPError('http://example.com', 503, 'Unavailable', {},
+                                StringIO.StringIO(xml)) for _ in range(4)]
+    for _ in range(4):
+        pytest.raises(TooManyRequests, api.item_lookup, '0201896834')
+    assert breaker.state(api.host) == CLOSED
+    assert breaker.rates(api.host) == (0.0, 0.0)
+    api.item_lookup('0201896834')
@@ -0,0 +1,83 @@
+import StringIO
+import threading
+import time
+import urlparse
+
+import pytest
+
+from amazonproduct.api import API
+from amazonproduct.errors import InvalidParameterValue
+
+from tests.utils import fake_lookup_response
+
+
+def pytest_funcarg__requested(request):
+    """
+    Replaces ``API._fetch`` with synthetic ItemLookup responses (ItemIds
+    starting with ``X`` are unknown) and returns the list of ItemIds
+    requested with each call.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    requested = []
+    lock = threading.Lock()
+    def fetch(self, url):
+        self._throttle()
+        query = dict(urlparse.parse_qsl(urlparse.urlsplit(url)[3]))
+        ids = query['ItemId'].split(',')
+        lock.acquire()
+        requested.append(ids)
+        lock.release()
+        time.sleep(.05)
+        return StringIO.StringIO(fake_lookup_response(ids))
+    monkeypatch.setattr(API, '_fetch', fetch)
+    return requested
+
+
+def pytest_funcarg__api(request):
+    api = API(locale='de')
+    api.REQUESTS_PER_SECOND = 10000
+    return api
+
+
+def test_ids_are_looked_up_ten_at_a_time(api, requested):
+    ids = ['A%02i' % i for i in range(25)]
+    items = [item.ASIN for item in api.bulk_item_lookup(iter(ids))]
+    assert items == ids
+    assert [len(chunk) for chunk in requested] == [10, 10, 5]
+
+
+def test_missing_ids_are_reported(api, requested):
+    ids = ['A1', 'X1', 'A2'] + ['A%02i' % i for i in range(10, 20)] + ['X2']
+    lookup = api.bulk_item_lookup(ids)
+    items = [item.ASIN for item in lookup]
+    assert items == [id for id in ids if not id.startswith('X')]
+    assert lookup.missing == ['X1', 'X2']
+    # a single unknown ItemId per request needs no extra request
+    assert len(requested) == 2
+
+
+def test_several_missing_ids_in_one_request(api, requested):
+    lookup = api.bulk_item_lookup(['X1', 'A1', 'X2', 'X3', 'A2'])
+    assert [item.ASIN for item in lookup] == ['A1', 'A2']
+    assert sorted(lookup.missing) == ['X1', 'X2', 'X3']
+
+
+def test_all_ids_missing(api, requested):
+    lookup = api.bulk_item_lookup(['X1', 'X2'])
+    assert list(lookup) == []
+    assert sorted(lookup.missing) == ['X1', 'X2']
+
+
+def test_other_errors_are_raised(api, monkeypatch):
+    def item_lookup(*ids, **params):
+        raise InvalidParameterValue('IdType', 'XYZ')
+    monkeypatch.setattr(api, 'item_lookup', item_lookup)
+    pytest.raises(InvalidParameterValue, list, api.bulk_item_lookup(['A1']))
+
+
+def test_concurrent_lookups_keep_order(api, requested):
+    ids = ['A%02i' % i for i in range(50)]
+    start = time.time()
+    items = [item.ASIN for item in api.bulk_item_lookup(ids, workers=5)]
+    assert items == ids
+    assert time.time() - start < 5 * .05
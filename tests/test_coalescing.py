@@ -0,0 +1,128 @@
+import StringIO
+import threading
+import time
+from urllib2 import URLError
+
+import pytest
+
+from amazonproduct.api import API
+from amazonproduct.errors import DeadlineExceeded
+
+from tests.utils import fake_search_response
+
+
+def pytest_funcarg__fetched(request):
+    """
+    Replaces ``API._fetch`` with a function which answers each request with a
+    synthetic response after 0.2 seconds and returns the list of fetched
+    URLs. Requests for ItemId ``FAIL`` fail with an ``URLError``.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    fetched = []
+    def fetch(self, url):
+        fetched.append(url)
+        time.sleep(.2)
+        if 'ItemId=FAIL' in url:
+            raise URLError('no connection')
+        return StringIO.StringIO(fake_search_response())
+    monkeypatch.setattr(API, '_fetch', fetch)
+    return fetched
+
+
+def call_concurrently(fn, args):
+    """
+    Calls ``fn`` with each of ``args`` in its own thread and returns results
+    (or exceptions) in the same order.
+    """
+    results = [None] * len(args)
+    def run(index, arg):
+        try:
+            results[index] = fn(arg)
+        except Exception, e:
+            results[index] = e
+    threads = [threading.Thread(target=run, args=(index, arg))
+               for index, arg in enumerate(args)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_calls_are_sent_once(fetched):
+    api = API(locale='de', coalesce=True)
+    results = call_concurrently(api.item_lookup, ['P1I0'] * 5)
+    assert len(fetched) == 1
+    assert [root.Items.Item[0].ASIN for root in results] == ['P1I0'] * 5
+
+
+def test_each_caller_gets_its_own_result(fetched):
+    api = API(locale='de', coalesce=True)
+    results = call_concurrently(api.item_lookup, ['P1I0'] * 3)
+    assert len(set(id(root) for root in results)) == 3
+    results[0].Items.remove(results[0].Items.Item[0])
+    assert results[1].Items.Item[0].ASIN == 'P1I0'
+
+
+def test_different_calls_are_not_coalesced(fetched):
+    api = API(locale='de', coalesce=True)
+    api.REQUESTS_PER_SECOND = 10000
+    call_concurrently(api.item_lookup, ['A', 'B', 'A'])
+    assert len(fetched) == 2
+
+
+def test_errors_are_shared(fetched):
+    api = API(locale='de', coalesce=True)
+    results = call_concurrently(api.item_lookup, ['FAIL'] * 3)
+    assert len(fetched) == 1
+    assert all(isinstance(result, URLError) for result in results)
+
+
+def test_sequential_calls_are_not_coalesced(fetched):
+    api = API(locale='de', coalesce=True)
+    api.REQUESTS_PER_SECOND = 10000
+    api.item_lookup('P1I0')
+    api.item_lookup('P1I0')
+    assert len(fetched) == 2
+
+
+def test_coalescing_is_off_by_default(fetched):
+    api = API(locale='de')
+    api.REQUESTS_PER_SECOND = 10000
+    call_concurrently(api.item_lookup, ['P1I0'] * 3)
+    assert len(fetched) == 3
+
+
+def test_followers_do_not_inherit_deadline_of_leader(monkeypatch):
+    fetched = []
+    def fetch(self, url):
+        fetched.append(url)
+        time.sleep(.2)
+        if len(fetched) == 1:
+            raise DeadlineExceeded  # the leader's time is up
+        return StringIO.StringIO(fake_search_response())
+    monkeypatch.setattr(API, '_fetch', fetch)
+    api = API(locale='de', coalesce=True)
+    api.REQUESTS_PER_SECOND = 10000
+    def lookup(deadline):
+        if deadline is None:
+            time.sleep(.05)  # let the caller with a deadline lead
+        return api.item_lookup('P1I0', deadline=deadline)
+    results = call_concurrently(lookup, [.1, None, None])
+    assert isinstance(results[0], DeadlineExceeded)
+    assert [root.Items.Item[0].ASIN for root in results[1:]] == ['P1I0'] * 2
+    assert len(fetched) == 2
+
+
+def test_cart_operations_are_never_coalesced(fetched):
+    api = API(locale='de', coalesce=True)
+    api.REQUESTS_PER_SECOND = 10000
+    create = lambda _: api.call(Operation='CartCreate', **{
+        'Item.1.ASIN': 'B00X', 'Item.1.Quantity': 1})
+    call_concurrently(create, range(3))
+    assert len(fetched) == 3
+
+
+def test_streaming_results_cannot_be_coalesced():
+    pytest.raises(ValueError, API, locale='de', coalesce=True,
+                  processor='amazonproduct.processors.iterparse')
@@ -0,0 +1,251 @@
+import BaseHTTPServer
+import gzip
+import httplib
+import socket
+import StringIO
+import threading
+import urllib2
+import pytest
+
+from tests.utils import fake_lookup_response
+
+from amazonproduct.api import API
+from amazonproduct.connection import ConnectionPool, GzipStream
+
+
+class KeepAliveHandler (BaseHTTPServer.BaseHTTPRequestHandler):
+
+    """
+    Answers every GET request with the content (and status code) currently
+    set on the server using HTTP/1.1 persistent connections.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += [self.path]
+        body = self.server.content
+        self.send_response(self.server.code)
+        if self.server.compress:
+            body = _gzip(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # drop connection without telling the client
+        self.close_connection = self.server.drop
+
+    def log_message(self, *args):
+        pass
+
+
+class KeepAliveServer (BaseHTTPServer.HTTPServer):
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+            KeepAliveHandler)
+        self.connections = 0
+        self.requests = []
+        self.content = '<xml/>'
+        self.code = 200
+        self.compress = False
+        self.drop = False
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server_address
+
+
+def pytest_funcarg__server(request):
+    def setup():
+        server = KeepAliveServer()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+    def teardown(server):
+        server.shutdown()
+        server.server_close()
+    return request.cached_setup(setup, teardown, 'function')
+
+
+def test_connection_is_reused(server):
+    pool = ConnectionPool()
+    for i in range(3):
+        assert pool.urlopen(server.url + '/onca/xml?i=%i' % i).read() == '<xml/>'
+    assert server.connections == 1
+    assert server.requests == ['/onca/xml?i=0', '/onca/xml?i=1', '/onca/xml?i=2']
+
+
+def test_unread_response_is_not_reused(server):
+    pool = ConnectionPool()
+    pool.urlopen(server.url).close()
+    pool.urlopen(server.url).read()
+    assert server.connections == 2
+
+
+def test_idle_connections_time_out(server):
+    pool = ConnectionPool(idle_timeout=0)
+    pool.urlopen(server.url).read()
+    pool.urlopen(server.url).read()
+    assert server.connections == 2
+
+
+def test_dropped_connection_is_replaced(server):
+    server.drop = True
+    pool = ConnectionPool()
+    pool.urlopen(server.url).read()
+    assert pool.urlopen(server.url).read() == '<xml/>'
+    assert server.connections == 2
+
+
+def test_gzipped_response(server):
+    server.compress = True
+    server.content = '<xml>%s</xml>' % ('x' * 10000)
+    assert ConnectionPool().urlopen(server.url).read() == server.content
+
+
+class CountingFile (object):
+
+    """
+    File-like object keeping track of how many bytes were read from it.
+    """
+
+    def __init__(self, content):
+        self.fp = StringIO.StringIO(content)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.consumed += len(data)
+        return data
+
+
+def _gzip(content):
+    buf = StringIO.StringIO()
+    gz = gzip.GzipFile(fileobj=buf, mode='w')
+    gz.write(content)
+    gz.close()
+    return buf.getvalue()
+
+
+def test_gzip_stream_inflates_incrementally():
+    content = ''.join('<Item>%i</Item>\n' % i for i in range(100000))
+    raw = CountingFile(_gzip(content))
+    stream = GzipStream(raw)
+    assert stream.read(100) == content[:100]
+    assert raw.consumed < len(raw.fp.getvalue())
+    assert stream.readline() == content[100:].split('\n')[0] + '\n'
+    assert stream.read(-1) == content[100:].split('\n', 1)[1]
+    assert stream.read() == ''
+    assert raw.consumed == len(raw.fp.getvalue())
+
+
+def test_http_error_is_raised(server):
+    server.code = 403
+    server.content = '<Error/>'
+    try:
+        ConnectionPool().urlopen(server.url)
+    except urllib2.HTTPError, e:
+        assert e.code == 403
+        assert e.read() == '<Error/>'
+    else:
+        pytest.fail('HTTPError not raised!')
+
+
+def test_api_uses_pool(server):
+    api = API(locale='de')
+    api.REQUESTS_PER_SECOND = 10000
+    assert isinstance(api.pool, ConnectionPool)
+    for i in range(3):
+        api._fetch(server.url).read()
+    assert server.connections == 1
+
+
+def test_api_without_pool(server):
+    api = API(locale='de', pool=False)
+    api.REQUESTS_PER_SECOND = 10000
+    assert api.pool is None
+    for i in range(2):
+        api._fetch(server.url).read()
+    assert server.connections == 2
+
+
+
+class FakeSocket (object):
+    timeout = None
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+
+class FakeConnection (object):
+
+    """
+    Connection which records its timeouts rather than connecting anywhere.
+    """
+
+    instances = []
+
+    def __init__(self, host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        self.host, self.timeout = host, timeout
+        self.sock = None
+        self.instances.append(self)
+    def set_debuglevel(self, level):
+        pass
+    def connect(self):
+        self.sock = FakeSocket()
+    def request(self, method, path, headers):
+        pass
+    def getresponse(self):
+        raise httplib.BadStatusLine('')
+    def close(self):
+        pass
+
+
+class FakeConnectionPool (ConnectionPool):
+    connection_class = FakeConnection
+
+
+@pytest.mark.parametrize(('timeout', 'connect', 'read'), [
+    ((2, 10), 2, 10),
+    (3, 3, 3),
+    (None, socket._GLOBAL_DEFAULT_TIMEOUT, None),
+])
+def test_timeouts(timeout, connect, read):
+    pytest.raises(urllib2.URLError, FakeConnectionPool().urlopen,
+                  'http://example.com/', timeout=timeout)
+    conn = FakeConnection.instances.pop()
+    assert conn.timeout == connect
+    assert conn.sock.timeout == read
+
+
+def test_api_does_not_change_default_timeout():
+    default = socket.getdefaulttimeout()
+    api = API(locale='de', timeout=(1, 2))
+    assert socket.getdefaulttimeout() == default
+    assert api.timeout == (1, 2)
+
+
+@pytest.mark.parametrize(('no_proxy', 'sent_by'), [
+    ('', 'http://proxy.example.com:3128'),
+    ('ecs.amazonaws.de', 'pool'),
+])
+def test_proxy_is_honoured(monkeypatch, no_proxy, sent_by):
+    monkeypatch.setenv('http_proxy', 'http://proxy.example.com:3128')
+    monkeypatch.setenv('no_proxy', no_proxy)
+    sent = []
+    def pool_urlopen(self, url, *args, **kwargs):
+        sent.append('pool')
+        return StringIO.StringIO(fake_lookup_response(['0201896834']))
+    def opener_open(self, request, *args, **kwargs):
+        sent.extend(handler.proxies['http'] for handler in self.handlers
+                    if isinstance(handler, urllib2.ProxyHandler))
+        return StringIO.StringIO(fake_lookup_response(['0201896834']))
+    monkeypatch.setattr(ConnectionPool, 'urlopen', pool_urlopen)
+    monkeypatch.setattr(urllib2.OpenerDirector, 'open', opener_open)
+    API(locale='de').item_lookup('0201896834')
+    assert sent == [sent_by]
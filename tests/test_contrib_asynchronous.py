@@ -0,0 +1,48 @@
+import StringIO
+import time
+import urlparse
+
+from amazonproduct.api import API
+from amazonproduct.contrib.asynchronous import AsyncAPI
+from amazonproduct.workers import Future
+
+from tests.utils import fake_search_response
+
+
+def pytest_funcarg__api(request):
+    """
+    AsyncAPI which answers every request with a synthetic ItemSearch response
+    of 3 pages after 0.2 seconds.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    def fetch(self, url):
+        self._throttle()
+        time.sleep(.2)
+        query = dict(urlparse.parse_qsl(urlparse.urlsplit(url)[3]))
+        page = int(query.get('ItemPage', 1))
+        return StringIO.StringIO(fake_search_response(page, pages=3))
+    monkeypatch.setattr(API, '_fetch', fetch)
+    api = AsyncAPI(locale='de', workers=5)
+    api.REQUESTS_PER_SECOND = 10000
+    return api
+
+
+def test_operations_return_futures(api):
+    future = api.item_lookup('P1I1')
+    assert isinstance(future, Future)
+    assert future.result().Items.Item[0].ASIN == 'P1I0'
+
+
+def test_requests_run_concurrently(api):
+    start = time.time()
+    futures = [api.item_lookup('P1I%i' % i) for i in range(5)]
+    for future in futures:
+        future.result()
+    assert time.time() - start < .5
+
+
+def test_iterpages(api):
+    paginator = api.item_search('Books', Title='Dummy')
+    pages = [future.result() for future in api.iterpages(paginator)]
+    assert [page.Items.Request.ItemSearchRequest.ItemPage for page in pages] \
+        == [1, 2, 3]
@@ -0,0 +1,435 @@
+import os
+import StringIO
+import struct
+import time
+
+import pytest
+
+try: # make it python2.4/2.5 compatible!
+    import multiprocessing
+except ImportError: # pragma: no cover
+    multiprocessing = None
+
+from amazonproduct.api import API
+from amazonproduct.contrib.caching import ResponseCachingAPI
+from amazonproduct.contrib.caching import FileStorage, ShardedFileStorage
+from amazonproduct.contrib.caching import SQLiteStorage, LogStorage
+from amazonproduct.contrib.caching import GZIP_MAGIC
+
+from amazonproduct.errors import InvalidParameterValue, InternalError
+from amazonproduct.errors import NoSimilarityForASIN
+
+from tests import XML_TEST_DIR
+from tests.utils import fake_search_response
+
+
+STORAGES = {
+    'file': lambda path: FileStorage(path),
+    'sharded': lambda path: ShardedFileStorage(path),
+    'sqlite': lambda path: SQLiteStorage(path + '.db'),
+    'log': lambda path: LogStorage(path + '.log'),
+}
+
+
+def pytest_generate_tests(metafunc):
+    if ('storage' in metafunc.funcargnames
+    or 'storage_factory' in metafunc.funcargnames):
+        for name in sorted(STORAGES):
+            metafunc.addcall(id=name, param=name)
+
+
+def pytest_funcarg__storage_factory(request):
+    """
+    Returns a function which opens (another instance of) the storage under
+    test. Name and path of the storage are available as attributes.
+    """
+    path = request.getfuncargvalue('tmpdir').join('storage').strpath
+    factory = lambda: STORAGES[request.param](path)
+    factory.name = request.param
+    factory.path = path
+    return factory
+
+
+def pytest_funcarg__storage(request):
+    storage = pytest_funcarg__storage_factory(request)()
+    request.addfinalizer(storage.close)
+    return storage
+
+
+def pytest_funcarg__fetched(request):
+    """
+    Replaces ``API._fetch`` with a synthetic ItemSearch response and returns
+    the list of URLs it was called with.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    fetched = []
+    def fetch(self, url):
+        fetched.append(url)
+        return StringIO.StringIO(fake_search_response())
+    monkeypatch.setattr(API, '_fetch', fetch)
+    return fetched
+
+
+def pytest_funcarg__cachedir(request):
+    tmpdir = request.getfuncargvalue('tmpdir')
+    return str(tmpdir.join('cache'))
+
+
+def test_responses_are_cached_on_disk(fetched, cachedir):
+    api = ResponseCachingAPI(locale='de', cachedir=cachedir, memsize=0)
+    assert api.memcache is None
+    for _ in range(3):
+        assert api.item_lookup('P1I0').Items.Item[0].ASIN == 'P1I0'
+    assert len(fetched) == 1
+    assert len(os.listdir(cachedir)) == 1
+
+
+def test_hot_responses_are_served_from_memory(fetched, cachedir):
+    api = ResponseCachingAPI(locale='de', cachedir=cachedir)
+    api.item_lookup('P1I0')
+    os.remove(os.path.join(cachedir, os.listdir(cachedir)[0]))
+    api.item_lookup('P1I0')
+    assert len(fetched) == 1
+    assert (api.memcache.hits, api.memcache.misses) == (1, 1)
+
+
+def test_file_cache_hits_are_kept_in_memory(fetched, cachedir):
+    ResponseCachingAPI(locale='de', cachedir=cachedir).item_lookup('P1I0')
+    api = ResponseCachingAPI(locale='de', cachedir=cachedir)
+    api.item_lookup('P1I0')
+    assert len(api.memcache) == 1
+    api.item_lookup('P1I0')
+    assert len(fetched) == 1
+    assert api.memcache.hits == 1
+
+
+def test_memory_only(fetched):
+    api = ResponseCachingAPI(locale='de', cachedir=None)
+    api.item_lookup('P1I0')
+    api.item_lookup('P1I0')
+    assert len(fetched) == 1
+
+
+def test_memory_budget(fetched):
+    api = ResponseCachingAPI(locale='de', cachedir=None, memsize=2)
+    for asin in ['A', 'B', 'C', 'A']:
+        api.item_lookup(asin)
+    assert len(fetched) == 4
+    assert len(api.memcache) == 2
+    assert api.memcache.evictions == 2
+
+
+def test_expired_responses_are_fetched_again(fetched, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    api = ResponseCachingAPI(locale='de', cachedir=None, cachetime=60)
+    api.item_lookup('P1I0')
+    now[0] += 59
+    api.item_lookup('P1I0')
+    assert len(fetched) == 1
+    now[0] += 2
+    api.item_lookup('P1I0')
+    assert len(fetched) == 2
+
+
+def test_parsed_results_are_cached(fetched, monkeypatch):
+    api = ResponseCachingAPI(locale='de', cachedir=None, resultsize=10)
+    parsed = []
+    def parse(fp):
+        parsed.append(fp)
+        return API._parse(api, fp)
+    monkeypatch.setattr(api, '_parse', parse)
+    api.item_lookup('P1I0')
+    second = api.item_lookup('P1I0')
+    assert len(fetched) == len(parsed) == 1
+    assert second.Items.Item[0].ASIN == 'P1I0'
+    assert api.resultcache.hits == 1
+
+
+def test_cached_results_are_copied(fetched):
+    api = ResponseCachingAPI(locale='de', cachedir=None, resultsize=10)
+    first = api.item_lookup('P1I0')
+    first.Items.remove(first.Items.Item[0])
+    second = api.item_lookup('P1I0')
+    second.Items.Item[0].ASIN._setText('changed')
+    third = api.item_lookup('P1I0')
+    assert second is not third
+    assert third.Items.Item[0].ASIN == 'P1I0'
+    assert len(fetched) == 1
+
+
+def test_parsed_results_expire_with_their_response(fetched, cachedir,
+                                                   monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    ResponseCachingAPI(locale='de', cachedir=cachedir).item_lookup('P1I0')
+    os.utime(os.path.join(cachedir, os.listdir(cachedir)[0]), (1000, 1000))
+    now[0] += 30
+    api = ResponseCachingAPI(locale='de', cachedir=cachedir, cachetime=60,
+                             resultsize=10)
+    api.item_lookup('P1I0')  # response is read from file cache
+    now[0] += 31
+    api.item_lookup('P1I0')
+    assert len(fetched) == 2
+
+
+
+def test_streaming_results_are_not_cached():
+    pytest.raises(ValueError, ResponseCachingAPI, locale='de', cachedir=None,
+                  resultsize=10, processor='amazonproduct.processors.iterparse')
+
+KEY = 'd41d8cd98f00b204e9800998ecf8427e'
+OTHER_KEY = '0cc175b9c0f1b6a831c399e269772661'
+
+
+def test_storage_roundtrip(storage):
+    assert storage.get(KEY) is None
+    storage.put(KEY, '<xml>1</xml>', 1000.0)
+    storage.put(OTHER_KEY, '<xml>2</xml>', 2000.0)
+    assert storage.get(KEY) == (1000.0, '<xml>1</xml>')
+    storage.put(KEY, '<xml>3</xml>', 3000.0)
+    assert storage.get(KEY) == (3000.0, '<xml>3</xml>')
+    assert storage.get(OTHER_KEY) == (2000.0, '<xml>2</xml>')
+
+
+def test_storage_is_shared_between_instances(storage, storage_factory):
+    other = storage_factory()
+    try:
+        storage.put(KEY, '<xml>1</xml>', 1000.0)
+        assert other.get(KEY) == (1000.0, '<xml>1</xml>')
+        other.put(KEY, '<xml>2</xml>', 2000.0)
+        assert storage.get(KEY) == (2000.0, '<xml>2</xml>')
+    finally:
+        other.close()
+
+
+def _put_responses(factory_name, path, offset):
+    storage = STORAGES[factory_name](path)
+    for i in range(offset, offset + 20):
+        storage.put(md5_key(i), '<xml>%i</xml>' % i, float(i))
+    storage.close()
+
+
+def md5_key(i):
+    return '%032x' % i
+
+
+@pytest.mark.skipif('multiprocessing is None')
+def test_storage_with_several_processes(storage_factory):
+    processes = [multiprocessing.Process(target=_put_responses,
+        args=(storage_factory.name, storage_factory.path, offset))
+                 for offset in (0, 20, 40)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    storage = storage_factory()
+    try:
+        for i in range(60):
+            assert storage.get(md5_key(i)) == (float(i), '<xml>%i</xml>' % i)
+    finally:
+        storage.close()
+
+
+
+def test_directories_created_by_others_are_fine(monkeypatch, tmpdir):
+    # another process creates the directory right after it was checked
+    monkeypatch.setattr(os.path, 'isdir', lambda path: False)
+    storage = ShardedFileStorage(tmpdir.strpath)
+    storage.put(KEY, '<xml/>', 1000.0)
+    storage.put(KEY, '<xml/>', 1000.0)
+
+def test_sharded_layout(tmpdir):
+    storage = ShardedFileStorage(tmpdir.strpath)
+    storage.put(KEY, '<xml/>', 1000.0)
+    assert tmpdir.join('d4', '1d', KEY + '.xml').check()
+
+
+def test_incomplete_log_records_are_ignored(tmpdir):
+    path = tmpdir.join('log').strpath
+    storage = LogStorage(path)
+    storage.put(KEY, '<xml>1</xml>', 1000.0)
+    # simulate a record which is still being written
+    fp = open(path, 'ab')
+    fp.write(struct.pack(LogStorage._header, OTHER_KEY, 2000.0, 100) + '<xml>')
+    fp.close()
+    assert storage.get(OTHER_KEY) is None
+    assert storage.get(KEY) == (1000.0, '<xml>1</xml>')
+
+
+def test_api_with_storage(fetched, storage):
+    api = ResponseCachingAPI(locale='de', storage=storage, memsize=0)
+    api.item_lookup('P1I0')
+    api = ResponseCachingAPI(locale='de', storage=storage, memsize=0)
+    assert api.item_lookup('P1I0').Items.Item[0].ASIN == 'P1I0'
+    assert len(fetched) == 1
+
+
+def test_responses_are_stored_as_received(fetched, storage):
+    api = ResponseCachingAPI(locale='de', storage=storage)
+    api.item_lookup('P1I0')
+    key = api.memcache._data.keys()[0]
+    assert storage.get(key)[1] == fake_search_response()
+
+
+def test_compressed_responses(fetched, storage):
+    api = ResponseCachingAPI(locale='de', storage=storage, compress=True)
+    api.item_lookup('P1I0')
+    key = api.memcache._data.keys()[0]
+    data = storage.get(key)[1]
+    assert data.startswith(GZIP_MAGIC)
+    assert len(data) < len(fake_search_response())
+    api = ResponseCachingAPI(locale='de', storage=storage, compress=True)
+    assert api.item_lookup('P1I0').Items.Item[0].ASIN == 'P1I0'
+    assert len(fetched) == 1
+
+
+def test_uncompressed_responses_can_still_be_read(fetched, storage):
+    ResponseCachingAPI(locale='de', storage=storage).item_lookup('P1I0')
+    api = ResponseCachingAPI(locale='de', storage=storage, compress=True)
+    assert api.item_lookup('P1I0').Items.Item[0].ASIN == 'P1I0'
+    assert len(fetched) == 1
+
+
+def wait_for_refresh(api):
+    while api._refreshing:
+        time.sleep(.01)
+
+
+def test_cachetimes_per_operation_and_response_group(fetched, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    api = ResponseCachingAPI(locale='de', cachedir=None, cachetime=100,
+        cachetimes={'ItemLookup': 50, 'Offers': 10, 'BrowseNodeLookup': 1000})
+    api.item_lookup('P1I0')
+    api.item_lookup('P1I0', ResponseGroup='Large,Offers')
+    api.browse_node_lookup(123)
+    api.similarity_lookup('P1I0')
+    assert len(fetched) == 4
+    now[0] += 20  # Offers expired
+    api.item_lookup('P1I0')
+    api.item_lookup('P1I0', ResponseGroup='Large,Offers')
+    assert len(fetched) == 5
+    now[0] += 40  # ItemLookup expired
+    api.item_lookup('P1I0')
+    api.similarity_lookup('P1I0')
+    assert len(fetched) == 6
+    now[0] += 50  # cachetime expired
+    api.similarity_lookup('P1I0')
+    api.browse_node_lookup(123)
+    assert len(fetched) == 7
+
+
+def test_stale_responses_are_revalidated_in_background(fetched, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    api = ResponseCachingAPI(locale='de', cachedir=None, cachetime=60,
+                             stale=30, resultsize=10)
+    api.item_lookup('P1I0')
+    now[0] += 70  # expired but still within stale window
+    assert api.item_lookup('P1I0').Items.Item[0].ASIN == 'P1I0'
+    wait_for_refresh(api)
+    assert len(fetched) == 2
+    # refreshed response is used
+    api.item_lookup('P1I0')
+    assert len(fetched) == 2
+    assert api.memcache.get(api.memcache._data.keys()[0])[0] == now[0]
+    now[0] += 100  # beyond stale window
+    api.item_lookup('P1I0')
+    assert len(fetched) == 3
+    assert not api._refreshing
+
+
+def test_stale_responses_from_storage(fetched, cachedir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    ResponseCachingAPI(locale='de', cachedir=cachedir).item_lookup('P1I0')
+    now[0] += 70
+    api = ResponseCachingAPI(locale='de', cachedir=cachedir, cachetime=60,
+                             stale=30)
+    api.item_lookup('P1I0')
+    wait_for_refresh(api)
+    assert len(fetched) == 2
+
+
+#: responses for ItemIds
+ERROR_RESPONSES = {
+    'INVALID': '2011-08-01/BrowseNodeLookup-de-fails-for-wrong-input.xml',
+    'NOSIMILAR': '2011-08-01/SimilarityLookup-de-no-similar-items-for-two-asins.xml',
+    'INTERNAL': 'internal-error.xml',
+}
+
+
+def pytest_funcarg__failing(request):
+    """
+    Replaces ``API._fetch`` with a function which answers requests for the
+    ItemIds in :data:`ERROR_RESPONSES` with errors and returns the list of
+    fetched URLs.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    fetched = []
+    def fetch(self, url):
+        fetched.append(url)
+        for item_id, path in ERROR_RESPONSES.items():
+            if 'ItemId=%s' % item_id in url:
+                return open(os.path.join(XML_TEST_DIR, path))
+        return StringIO.StringIO(fake_search_response())
+    monkeypatch.setattr(API, '_fetch', fetch)
+    return fetched
+
+
+def test_deterministic_errors_are_cached(failing):
+    api = ResponseCachingAPI(locale='de', cachedir=None, memsize=0,
+                             errortime=60)
+    first = pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+    second = pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+    assert len(failing) == 1
+    assert first.value is not second.value
+    assert (first.value.code, first.value.msg) == \
+        (second.value.code, second.value.msg)
+    pytest.raises(NoSimilarityForASIN, api.similarity_lookup, 'NOSIMILAR')
+    pytest.raises(NoSimilarityForASIN, api.similarity_lookup, 'NOSIMILAR')
+    assert len(failing) == 2
+
+
+def test_transient_errors_are_not_cached(failing):
+    api = ResponseCachingAPI(locale='de', cachedir=None, memsize=0,
+                             errortime=60)
+    pytest.raises(InternalError, api.item_lookup, 'INTERNAL')
+    pytest.raises(InternalError, api.item_lookup, 'INTERNAL')
+    assert len(failing) == 2
+
+
+def test_cached_errors_expire(failing, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    api = ResponseCachingAPI(locale='de', cachedir=None, memsize=0,
+                             errortime=60)
+    pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+    now[0] += 61
+    pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+    assert len(failing) == 2
+
+
+def test_error_responses_are_not_stored(failing, cachedir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    api = ResponseCachingAPI(locale='de', cachedir=cachedir, cachetime=3600,
+                             errortime=60)
+    for _ in range(3):
+        pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+        now[0] += 61
+    assert len(failing) == 3
+    pytest.raises(InternalError, api.item_lookup, 'INTERNAL')
+    pytest.raises(InternalError, api.item_lookup, 'INTERNAL')
+    assert len(failing) == 5
+    api.item_lookup('VALID')
+    api.item_lookup('VALID')
+    assert len(failing) == 6
+
+
+def test_errors_are_not_cached_by_default(failing):
+    api = ResponseCachingAPI(locale='de', cachedir=None, memsize=0)
+    pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+    pytest.raises(InvalidParameterValue, api.item_lookup, 'INVALID')
+    assert len(failing) == 2
@@ -1,9 +1,13 @@
+import random
 import socket
-from urllib2 import URLError
+import time
+from urllib2 import HTTPError, URLError
 import pytest
 
 from amazonproduct.api import API
-from amazonproduct.contrib.retry import RetryAPI
+from amazonproduct.contrib.retry import RetryAPI, RetryBudget, RetryPolicy
+from amazonproduct.errors import AWSError, InternalError, TooManyRequests
+from amazonproduct.errors import InvalidParameterValue
 
 @pytest.mark.slowtest
 def test_timeout(monkeypatch):
@@ -14,13 +18,14 @@ def test_timeout(monkeypatch):
     class mock_fetch (object):
         def __init__(self):
             self.calls = 0
-        def __call__(self, _, url):
+        def __call__(self, url):
             self.calls += 1
             print 'call %i: %s' % (self.calls, url)
             raise URLError(socket.timeout())
 
     fetcher = mock_fetch()
     monkeypatch.setattr(API, '_fetch', fetcher)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
 
     api = RetryAPI(locale='de')
 
@@ -33,4 +38,126 @@ def test_timeout(monkeypatch):
 
     # timeout WAS raised and fetch was called TRIES times
     assert not itworked
-    assert fetcher.calls == api.TRIES
\ No newline at end of file
+    assert fetcher.calls == api.TRIES
+
+class failing_request (object):
+
+    """
+    Replacement for ``API._request`` raising the given errors one after
+    another (and returning ``'ok'`` once there are none left).
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, _, url):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def pytest_funcarg__sleeps(request):
+    """
+    Records the delays between tries instead of actually waiting (the clock
+    is advanced nevertheless).
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    sleeps = []
+    now = [time.time()]
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr(time, 'sleep', sleep)
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return sleeps
+
+
+@pytest.mark.parametrize('error', [
+    URLError(socket.timeout()),
+    URLError(socket.error(104, 'Connection reset by peer')),
+    HTTPError('http://example.com', 503, 'Unavailable', {}, None),
+    InternalError(),
+    TooManyRequests(),
+    AWSError(code='ServiceUnavailable', msg='Try again later.'),
+])
+def test_temporary_errors_are_retried(monkeypatch, sleeps, error):
+    fetcher = failing_request(error, error)
+    monkeypatch.setattr(API, '_request', fetcher)
+    api = RetryAPI(locale='de', policy=RetryPolicy(budget=None))
+    assert api.call(Operation='ItemLookup') == 'ok'
+    assert fetcher.calls == 3
+
+
+@pytest.mark.parametrize('error', [
+    URLError('unknown host'),
+    HTTPError('http://example.com', 404, 'Not Found', {}, None),
+    InvalidParameterValue('ItemId', '0201896834'),
+    AWSError(code='AWS.MissingParameters', msg='Parameter missing.'),
+])
+def test_permanent_errors_are_not_retried(monkeypatch, sleeps, error):
+    fetcher = failing_request(error)
+    monkeypatch.setattr(API, '_request', fetcher)
+    api = RetryAPI(locale='de', policy=RetryPolicy(budget=None))
+    pytest.raises(type(error), api.call, Operation='ItemLookup')
+    assert fetcher.calls == 1
+    assert sleeps == []
+
+
+def test_exponential_backoff(monkeypatch, sleeps):
+    monkeypatch.setattr(API, '_request', failing_request(*[InternalError()] * 6))
+    policy = RetryPolicy(tries=6, delay=1, backoff=2, max_delay=10,
+                         budget=None, jitter=False)
+    api = RetryAPI(locale='de', policy=policy)
+    pytest.raises(InternalError, api.call, Operation='ItemLookup')
+    assert sleeps == [1, 2, 4, 8, 10]
+
+
+def test_full_jitter(monkeypatch, sleeps):
+    monkeypatch.setattr(random, 'uniform', lambda a, b: (a, b))
+    policy = RetryPolicy(delay=1, backoff=3, max_delay=20)
+    assert [policy.backoff_delay(n) for n in range(1, 5)] == [
+        (0, 1), (0, 3), (0, 9), (0, 20)]
+
+
+def test_no_retry_after_deadline(monkeypatch, sleeps):
+    fetcher = failing_request(*[InternalError()] * 5)
+    monkeypatch.setattr(API, '_request', fetcher)
+    policy = RetryPolicy(delay=2, backoff=2, deadline=5, budget=None,
+                         jitter=False)
+    api = RetryAPI(locale='de', policy=policy)
+    pytest.raises(InternalError, api.call, Operation='ItemLookup')
+    # waiting another 4 seconds would exceed the deadline
+    assert sleeps == [2]
+    assert fetcher.calls == 2
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=.5, min_retries=1, ttl=60)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    for _ in range(4):
+        budget.deposit()
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_retry_budget_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    budget = RetryBudget(ratio=0, min_retries=1, ttl=10)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    now[0] += 10
+    assert budget.withdraw()
+
+
+def test_exhausted_budget_stops_retries(monkeypatch, sleeps):
+    fetcher = failing_request(*[InternalError()] * 5)
+    monkeypatch.setattr(API, '_request', fetcher)
+    budget = RetryBudget(ratio=0, min_retries=2)
+    api = RetryAPI(locale='de', policy=RetryPolicy(budget=budget))
+    pytest.raises(InternalError, api.call, Operation='ItemLookup')
+    assert fetcher.calls == 3
@@ -0,0 +1,118 @@
+import socket
+import StringIO
+import time
+import urllib2
+
+import pytest
+
+from tests.utils import fake_lookup_response, fake_search_response
+
+from amazonproduct.api import API
+from amazonproduct.connection import ConnectionPool
+from amazonproduct.contrib.retry import RetryAPI, RetryPolicy
+from amazonproduct.errors import DeadlineExceeded, InternalError
+from amazonproduct.throttle import TokenBucket
+
+
+def pytest_funcarg__requests(request):
+    """
+    Replaces ``ConnectionPool.urlopen`` and returns the list of timeouts the
+    requests were sent with.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    timeouts = []
+    def urlopen(self, url, headers=None, debuglevel=0, timeout=None):
+        timeouts.append(timeout)
+        if 'ItemSearch' in url:
+            page = int(url.split('ItemPage=')[1].split('&')[0])
+            return StringIO.StringIO(fake_search_response(page, pages=3))
+        return StringIO.StringIO(fake_lookup_response(['0201896834']))
+    monkeypatch.setattr(ConnectionPool, 'urlopen', urlopen)
+    return timeouts
+
+
+def pytest_funcarg__api(request):
+    api = API(locale='de', timeout=(2, 10))
+    api.REQUESTS_PER_SECOND = 10000
+    return api
+
+
+def test_timeouts_are_passed_on(api, requests):
+    api.item_lookup('0201896834')
+    assert requests == [(2, 10)]
+
+
+def test_timeouts_are_cut_to_deadline(api, requests):
+    api.item_lookup('0201896834', deadline=5)
+    connect, read = requests[0]
+    assert connect == 2
+    assert 4.5 < read <= 5
+
+
+def test_deadline_is_not_sent_to_amazon(api, monkeypatch):
+    urls = []
+    monkeypatch.setattr(API, '_fetch', lambda self, url: urls.append(url) or
+        StringIO.StringIO(fake_lookup_response(['0201896834'])))
+    api.item_lookup('0201896834', deadline=5)
+    assert 'deadline' not in urls[0]
+
+
+def test_expired_deadline(api, requests):
+    pytest.raises(DeadlineExceeded, api.item_lookup, '0201896834',
+                  deadline=0)
+    assert requests == []
+
+
+def test_throttle_fails_fast_without_wasting_slot(requests):
+    limiter = TokenBucket(rate=1)
+    api = API(locale='de', limiter=limiter)
+    api.item_lookup('0201896834')
+    tat = limiter._tat
+    start = time.time()
+    pytest.raises(DeadlineExceeded, api.item_lookup, '0201896834',
+                  deadline=.5)
+    assert time.time() - start < .1
+    assert limiter._tat == tat
+
+
+def test_limiter_timeout():
+    limiter = TokenBucket(rate=10)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=.05)
+    assert limiter.acquire(timeout=.2)
+
+
+def test_deadline_covers_all_pages(api, requests, monkeypatch):
+    clock = [time.time()]
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+    paginator = api.item_search('Books', Publisher='Galileo Press',
+                                deadline=10)
+    clock[0] += 4
+    paginator.page(2)
+    assert requests[1][1] == 6
+    clock[0] += 6
+    pytest.raises(DeadlineExceeded, paginator.page, 3)
+    assert len(requests) == 2
+
+
+def test_socket_timeout_caused_by_deadline(api, monkeypatch):
+    def urlopen(self, url, headers=None, debuglevel=0, timeout=None):
+        raise urllib2.URLError(socket.timeout('timed out'))
+    monkeypatch.setattr(ConnectionPool, 'urlopen', urlopen)
+    pytest.raises(urllib2.URLError, api.item_lookup, '0201896834')
+    pytest.raises(DeadlineExceeded, api.item_lookup, '0201896834',
+                  deadline=1)
+
+
+def test_retries_respect_deadline(monkeypatch):
+    calls = []
+    def request(self, url):
+        calls.append(url)
+        raise InternalError
+    monkeypatch.setattr(API, '_request', request)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    policy = RetryPolicy(tries=5, delay=2, jitter=False, budget=None)
+    api = RetryAPI(locale='de', policy=policy)
+    pytest.raises(InternalError, api.item_lookup, '0201896834', deadline=3)
+    # the second retry would have to wait another 4 seconds
+    assert len(calls) == 2
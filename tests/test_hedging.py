@@ -0,0 +1,170 @@
+import StringIO
+import threading
+import time
+
+import pytest
+
+from tests.utils import fake_lookup_response
+
+from amazonproduct.api import API
+from amazonproduct.connection import ConnectionPool
+from amazonproduct.errors import InternalError
+from amazonproduct.hedging import Hedger
+
+
+class slow_request (object):
+
+    """
+    Replacement for ``API._send`` which takes the given number of seconds
+    for each call (and raises the error if one is given instead). The n-th
+    response contains item ``RESPONSE<n>``.
+    """
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        self._lock.acquire()
+        n = len(self.calls)
+        self.calls.append(url)
+        delay = self.delays[n]
+        self._lock.release()
+        if isinstance(delay, Exception):
+            raise delay
+        time.sleep(delay)
+        return StringIO.StringIO(fake_lookup_response(['RESPONSE%i' % n]))
+
+
+def pytest_funcarg__api(request):
+    api = API(locale='de', hedge=Hedger(delay=.05, min_samples=1))
+    api.REQUESTS_PER_SECOND = 10000
+    return api
+
+
+def asin(root):
+    return root.Items.Item[0].ASIN
+
+
+def test_fast_request_is_not_hedged(monkeypatch, api):
+    monkeypatch.setattr(API, '_send', slow_request(0))
+    assert asin(api.item_lookup('0201896834')) == 'RESPONSE0'
+    assert api.hedger.hedged == 0
+
+
+def test_slow_request_is_hedged(monkeypatch, api):
+    request = slow_request(.5, 0)
+    monkeypatch.setattr(API, '_send', request)
+    start = time.time()
+    assert asin(api.item_lookup('0201896834')) == 'RESPONSE1'
+    assert time.time() - start < .4
+    assert len(request.calls) == 2
+    assert request.calls[0] == request.calls[1]
+    assert api.hedger.hedged == 1
+
+
+def test_first_response_wins(monkeypatch, api):
+    monkeypatch.setattr(API, '_send', slow_request(.1, .5))
+    assert asin(api.item_lookup('0201896834')) == 'RESPONSE0'
+
+
+def test_error_is_raised_only_if_both_fail(monkeypatch, api):
+    monkeypatch.setattr(API, '_send', slow_request(.1, InternalError()))
+    assert asin(api.item_lookup('0201896834')) == 'RESPONSE0'
+    monkeypatch.setattr(API, '_send',
+                        slow_request(InternalError(), 0))
+    pytest.raises(InternalError, api.item_lookup, '0201896834')
+
+
+def test_cart_operations_are_not_hedged(monkeypatch, api):
+    request = slow_request(.2, 0)
+    monkeypatch.setattr(API, '_send', request)
+    root = api.call(Operation='CartGet', CartId='1', HMAC='x')
+    assert asin(root) == 'RESPONSE0'
+    assert len(request.calls) == 1
+    pytest.raises(ValueError, Hedger, operations=['ItemLookup', 'CartAdd'])
+
+
+def test_hedge_delay_is_percentile():
+    hedger = Hedger(percentile=90, window=10, min_samples=5, delay=3)
+    for latency in range(4):
+        hedger.record(latency)
+    assert hedger.hedge_delay() == 3
+    for latency in range(4, 20):
+        hedger.record(latency)
+    # only the last 10 latencies (10..19) count
+    assert hedger.hedge_delay() == 18
+
+
+class counting_limiter (object):
+
+    """
+    Rate limiter which counts the slots taken and keeps the first caller
+    waiting for ``wait`` seconds. It has no free slot while ``full``.
+    """
+
+    def __init__(self, wait=0, full=False):
+        self.wait = wait
+        self.full = full
+        self.acquired = 0
+
+    def acquire(self, timeout=None):
+        if self.full and timeout is not None:
+            return False
+        self.acquired += 1
+        if self.acquired == 1:
+            time.sleep(self.wait)
+        return True
+
+    def success(self):
+        pass
+
+
+def slow_urlopen(*delays):
+    """
+    Replacement for ``ConnectionPool.urlopen`` which takes the given number
+    of seconds for each call.
+    """
+    calls = []
+    def urlopen(*args, **kwargs):
+        calls.append(args)
+        time.sleep(delays[len(calls) - 1])
+        return StringIO.StringIO(fake_lookup_response(['0201896834']))
+    urlopen.calls = calls
+    return urlopen
+
+
+def test_hedges_are_charged_against_limiter(monkeypatch):
+    limiter = counting_limiter()
+    api = API(locale='de', limiter=limiter,
+              hedge=Hedger(delay=.05, min_samples=1))
+    monkeypatch.setattr(ConnectionPool, 'urlopen', slow_urlopen(.2, 0))
+    api.item_lookup('0201896834')
+    assert limiter.acquired == 2
+    assert api.hedger.hedged == 1
+
+
+def test_requests_waiting_for_limiter_are_not_hedged(monkeypatch):
+    limiter = counting_limiter(wait=.2)
+    api = API(locale='de', limiter=limiter,
+              hedge=Hedger(delay=.05, min_samples=1))
+    urlopen = slow_urlopen(0, 0)
+    monkeypatch.setattr(ConnectionPool, 'urlopen', urlopen)
+    api.item_lookup('0201896834')
+    assert len(urlopen.calls) == 1
+    assert limiter.acquired == 1
+    assert api.hedger.hedged == 0
+    # the time spent waiting for the limiter is no latency
+    assert api.hedger.hedge_delay() < .1
+
+
+def test_no_hedge_without_free_slot(monkeypatch):
+    limiter = counting_limiter(full=True)
+    api = API(locale='de', limiter=limiter,
+              hedge=Hedger(delay=.05, min_samples=1))
+    urlopen = slow_urlopen(.2, 0)
+    monkeypatch.setattr(ConnectionPool, 'urlopen', urlopen)
+    api.item_lookup('0201896834')
+    assert len(urlopen.calls) == 1
+    assert api.hedger.hedged == 0
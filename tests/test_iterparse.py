@@ -0,0 +1,98 @@
+import os.path
+import StringIO
+import pytest
+
+from amazonproduct.errors import AWSError
+from amazonproduct.processors.iterparse import Processor, StreamingPaginator
+
+from tests import XML_TEST_DIR
+from tests.utils import fake_search_response
+
+
+class CountingFile (object):
+
+    def __init__(self, content):
+        self.fp = StringIO.StringIO(content)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.consumed += len(data)
+        return data
+
+
+def test_items_are_parsed_incrementally():
+    content = fake_search_response(per_page=20000)
+    fp = CountingFile(content)
+    response = Processor().parse(fp)
+    assert response.root.findtext('{*}Items/{*}TotalPages') == '1'
+    items = iter(response)
+    first = items.next()
+    assert first.findtext('{*}ASIN') == 'P1I0'
+    assert fp.consumed < len(content)
+    assert len(list(items)) == 19999
+    assert fp.consumed == len(content)
+
+
+def test_items_are_cleared():
+    response = Processor().parse(StringIO.StringIO(fake_search_response()))
+    asins = []
+    for item in response:
+        asins.append(item.findtext('{*}ASIN'))
+        # items already processed are removed
+        assert [sibling for sibling in item.itersiblings(preceding=True)
+                if sibling.tag.endswith('Item')] == []
+    assert asins == ['P1I%i' % i for i in range(10)]
+    # can only be iterated once
+    assert list(response) == []
+
+
+def test_response_without_items():
+    path = os.path.join(XML_TEST_DIR, '2011-08-01',
+                        'BrowseNodeLookup-de-books-browsenode.xml')
+    response = Processor().parse(open(path))
+    assert response.root.find('{*}BrowseNodes') is not None
+    assert list(response) == []
+
+
+@pytest.mark.parametrize('name, code', [
+    ('ItemLookup-de-invalid-item-id.xml', 'AWS.InvalidParameterValue'),
+    ('APICalls-fails-for-too-many-requests.xml', 'RequestThrottled'),
+])
+def test_errors_are_raised(name, code):
+    path = os.path.join(XML_TEST_DIR, '2011-08-01', name)
+    if not os.path.exists(path):
+        path = os.path.join(XML_TEST_DIR, name)
+    try:
+        Processor().parse(open(path))
+    except AWSError, e:
+        assert e.code == code
+        assert e.msg
+        assert e.xml is not None
+    else:
+        pytest.fail('No AWSError raised!')
+
+
+def test_paginator():
+    processor = Processor()
+    def search(**kwargs):
+        page = kwargs['ItemPage']
+        return processor.parse(StringIO.StringIO(
+            fake_search_response(page, pages=3)))
+    paginator = StreamingPaginator(search, Operation='ItemSearch')
+    assert (paginator.pages, paginator.results) == (3, 30)
+    asins = [item.findtext('{*}ASIN') for item in paginator]
+    assert len(asins) == 30
+    assert asins[-1] == 'P3I9'
+    assert paginator.current == 3
+
+
+def test_paginator_ignores_cache_limits():
+    processor = Processor()
+    def search(**kwargs):
+        return processor.parse(StringIO.StringIO(
+            fake_search_response(kwargs['ItemPage'], pages=3)))
+    paginator = StreamingPaginator(search, Operation='ItemSearch',
+                                   cache_size=2, cache_bytes=100000)
+    assert len(list(paginator)) == 30
+    assert len(paginator._pagecache) == 0
@@ -0,0 +1,151 @@
+import StringIO
+import threading
+import time
+
+from amazonproduct.processors import _approximate_size
+from amazonproduct.processors.objectify import Processor
+from amazonproduct.processors._lxml import SearchPaginator, compile_xpath
+
+from tests.utils import fake_search_response
+
+
+class FakeSearch (object):
+
+    """
+    Stands in for ``API.call`` returning synthetic search results with
+    ``pages`` pages after ``delay`` seconds each.
+    """
+
+    def __init__(self, pages=10, delay=0):
+        self.pages = pages
+        self.delay = delay
+        self.processor = Processor()
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        page = kwargs['ItemPage']
+        self._lock.acquire()
+        self.requested.append(page)
+        self._lock.release()
+        time.sleep(self.delay)
+        return self.processor.parse(StringIO.StringIO(
+            fake_search_response(page, self.pages)))
+
+
+def test_pages_are_fetched_sequentially():
+    search = FakeSearch(pages=3)
+    paginator = SearchPaginator(search, Operation='ItemSearch')
+    pages = [page.Items.Request.ItemSearchRequest.ItemPage
+             for page in paginator.iterpages()]
+    assert pages == [1, 2, 3]
+    assert search.requested == [1, 2, 3]
+
+
+def test_prefetched_pages_are_returned_in_order():
+    search = FakeSearch(pages=10, delay=.1)
+    start = time.time()
+    paginator = SearchPaginator(search, Operation='ItemSearch', prefetch=9)
+    pages = [page.Items.Request.ItemSearchRequest.ItemPage
+             for page in paginator.iterpages()]
+    assert pages == range(1, 11)
+    assert paginator.current == 10
+    # first page + all others at once
+    assert time.time() - start < .5
+    assert sorted(search.requested) == range(1, 11)
+
+
+def test_prefetch_respects_limit():
+    search = FakeSearch(pages=10)
+    paginator = SearchPaginator(search, Operation='ItemSearch', prefetch=5,
+                                limit=3)
+    assert len(list(paginator)) == 30
+    assert sorted(search.requested) == [1, 2, 3]
+
+
+def test_prefetch_depth():
+    search = FakeSearch(pages=10)
+    paginator = SearchPaginator(search, Operation='ItemSearch', prefetch=2)
+    pages = paginator.iterpages()
+    pages.next()
+    pages.next()
+    time.sleep(.1)
+    assert sorted(search.requested) == [1, 2, 3, 4]
+
+
+def test_prefetch_threads_are_stopped():
+    before = threading.activeCount()
+    for _ in range(20):
+        search = FakeSearch(pages=5)
+        paginator = SearchPaginator(search, Operation='ItemSearch', prefetch=3)
+        list(paginator)
+    pages = SearchPaginator(search, Operation='ItemSearch',
+                            prefetch=3).iterpages()
+    pages.next()
+    pages.next()
+    pages.close()  # given up half-way
+    time.sleep(.1)
+    assert threading.activeCount() == before
+
+
+def test_all_pages_are_cached_by_default():
+    search = FakeSearch(pages=5)
+    paginator = SearchPaginator(search, Operation='ItemSearch')
+    list(paginator)
+    list(paginator)
+    assert search.requested == [1, 2, 3, 4, 5]
+    assert len(paginator._pagecache) == 5
+
+
+def test_cache_size_is_bounded():
+    search = FakeSearch(pages=5)
+    paginator = SearchPaginator(search, Operation='ItemSearch', cache_size=2)
+    list(paginator)
+    assert len(paginator._pagecache) == 2
+    assert paginator._pagecache.evictions == 3
+
+
+def test_cache_bytes_are_bounded():
+    search = FakeSearch(pages=5)
+    paginator = SearchPaginator(search, Operation='ItemSearch',
+                                cache_bytes=10000)
+    list(paginator)
+    assert 0 < paginator._pagecache.size <= 10000
+    assert 0 < len(paginator._pagecache) < 5
+
+
+def test_approximate_size_without_iter():
+    from xml.etree import ElementTree
+    root = ElementTree.fromstring('<Items><Item>abc</Item></Items>')
+    class OldElement (object):
+        # ElementTree elements before Python 2.7 know only getiterator()
+        getiterator = root.getiterator
+    assert _approximate_size(OldElement()) == _approximate_size(root) > 0
+
+
+def test_streaming_keeps_no_pages():
+    search = FakeSearch(pages=5)
+    paginator = SearchPaginator(search, Operation='ItemSearch', streaming=True)
+    assert len(list(paginator)) == 50
+    assert len(paginator._pagecache) == 0
+    assert search.requested == [1, 2, 3, 4, 5]
+
+
+def test_streaming_with_prefetch():
+    search = FakeSearch(pages=5)
+    paginator = SearchPaginator(search, Operation='ItemSearch', streaming=True,
+                                prefetch=2)
+    assert len(list(paginator)) == 50
+    assert len(paginator._pagecache) == 0
+
+
+def test_xpath_expressions_are_compiled_once():
+    xpath = compile_xpath('/*/aws:Items/aws:Item', 'urn:test')
+    assert compile_xpath('/*/aws:Items/aws:Item', 'urn:test') is xpath
+    assert compile_xpath('/*/aws:Items/aws:Item', 'urn:other') is not xpath
+
+
+def test_xpath_without_namespace():
+    from lxml import etree
+    root = etree.fromstring('<R><Items><Item/><Item/></Items></R>')
+    assert len(compile_xpath('/*/aws:Items/aws:Item', '')(root)) == 2
@@ -0,0 +1,49 @@
+import glob
+import os
+
+from lxml import etree
+import pytest
+
+from amazonproduct.errors import AWSError
+from amazonproduct.processors import elementtree, etree as etree_processor
+from amazonproduct.processors import minidom, objectify
+
+_here = os.path.dirname(__file__)
+
+#: All XML responses containing error messages
+ERROR_RESPONSES = sorted(
+    path for path in glob.glob(os.path.join(_here, '*', '*.xml'))
+    + glob.glob(os.path.join(_here, '*.xml'))
+    if etree.parse(path).xpath('//*[local-name()="Error"]'))
+
+PROCESSORS = [
+    objectify.Processor(),
+    etree_processor.Processor(),
+    elementtree.Processor(),
+    minidom.Processor(),
+]
+
+
+def pytest_generate_tests(metafunc):
+    if 'processor' in metafunc.funcargnames:
+        metafunc.parametrize('processor', PROCESSORS)
+
+
+def expected_error(path):
+    """
+    Returns code and message of the first error anywhere in the document.
+    """
+    error = etree.parse(path).xpath('//*[local-name()="Error"]')[0]
+    return (error.xpath('string(*[local-name()="Code"])'),
+            error.xpath('string(*[local-name()="Message"])'))
+
+
+def test_errors_are_found_at_known_locations(processor):
+    assert ERROR_RESPONSES
+    for path in ERROR_RESPONSES:
+        fp = open(path)
+        try:
+            e = pytest.raises(AWSError, processor.parse, fp).value
+        finally:
+            fp.close()
+        assert (e.code, e.msg) == expected_error(path), path
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from base64 import b64encode
+from hashlib import sha256
+import hmac
+import urllib2
+from urlparse import parse_qs, urlparse
+
+import pytest
+
+from amazonproduct.api import API
+from amazonproduct.signing import Signer
+
+TIMESTAMP = '2014-04-01T12:00:00Z'
+
+
+def reference_url(host, secret_key, params):
+    """
+    Straightforward implementation of Amazon's signing algorithm.
+    """
+    params = dict((key, val) for key, val in params.items() if val is not None)
+    args = '&'.join('%s=%s' % (key, urllib2.quote(unicode(params[key])
+                    .encode('utf-8'), safe='~')) for key in sorted(params))
+    msg = 'GET\n%s\n/onca/xml\n%s' % (host, args)
+    signature = urllib2.quote(
+        b64encode(hmac.new(secret_key, msg, sha256).digest()))
+    return 'http://%s/onca/xml?%s&Signature=%s' % (host, args, signature)
+
+
+CONSTANTS = {
+    'Service': 'AWSECommerceService',
+    'Version': '2011-08-01',
+    'AssociateTag': 'tag-21',
+}
+
+
+@pytest.mark.parametrize('params', [
+    {'Operation': 'ItemLookup', 'ItemId': '0201896834'},
+    {'Operation': 'ItemSearch', 'SearchIndex': 'Books',
+     'Keywords': u'Gr\xfc\xdfe & K\xfcsse ~ 100%', 'ItemPage': 3},
+    {'Operation': 'ItemLookup', 'ItemId': 'B00008OE6I', 'Condition': None,
+     'Version': '2010-10-01'},
+    {'Operation': 'CartCreate', 'Item.1.ASIN': '0201896834',
+     'Item.1.Quantity': 1, 'AssociateTag': 'other-21'},
+])
+def test_same_as_reference(params):
+    signer = Signer('ecs.amazonaws.de', 'XXX', 'secret', CONSTANTS)
+    expected = dict(CONSTANTS, AWSAccessKeyId='XXX', Timestamp=TIMESTAMP)
+    expected.update(params)
+    assert signer.sign(params, TIMESTAMP) == \
+        reference_url('ecs.amazonaws.de', 'secret', expected)
+
+
+def test_response_groups_are_joined():
+    signer = Signer('ecs.amazonaws.de', 'XXX', 'secret')
+    url = signer.sign({'ResponseGroup': ['Small', 'Images']})
+    assert parse_qs(urlparse(url)[4])['ResponseGroup'] == ['Small,Images']
+
+
+def test_sign_many():
+    signer = Signer('ecs.amazonaws.de', 'XXX', 'secret', CONSTANTS)
+    requests = [{'Operation': 'ItemLookup', 'ItemId': id}
+                for id in ('0201896834', '0201896842')]
+    urls = signer.sign_many(requests)
+    timestamps = [parse_qs(urlparse(url)[4])['Timestamp'][0] for url in urls]
+    assert timestamps[0] == timestamps[1]
+    assert urls == [signer.sign(params, timestamps[0]) for params in requests]
+
+
+def test_api_signer_follows_changes():
+    api = API('XXX', 'secret', 'de', associate_tag='tag-21')
+    signer = api.signer
+    assert api.signer is signer
+    api.VERSION = '2010-10-01'
+    assert api.signer is not signer
+    url = api._build_url(Operation='ItemLookup', ItemId='0201896834')
+    qs = parse_qs(urlparse(url)[4])
+    assert qs['Version'] == ['2010-10-01']
+    assert qs['AssociateTag'] == ['tag-21']
+    assert qs['Service'] == ['AWSECommerceService']
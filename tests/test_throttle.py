@@ -0,0 +1,180 @@
+import os.path
+import StringIO
+import threading
+import time
+import urllib2
+import pytest
+
+try: # make it python2.4/2.5 compatible!
+    import multiprocessing
+except ImportError: # pragma: no cover
+    multiprocessing = None
+
+from tests import XML_TEST_DIR
+from tests.utils import fake_search_response
+
+from amazonproduct.api import API
+from amazonproduct.contrib.caching import ResponseCachingAPI
+from amazonproduct.errors import TooManyRequests
+from amazonproduct.throttle import TokenBucket, SharedTokenBucket
+from amazonproduct.throttle import AdaptiveTokenBucket
+
+
+def test_rate_is_kept():
+    limiter = TokenBucket(rate=20)
+    start = time.time()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.time() - start >= 4 / 20.0
+
+
+def test_burst():
+    limiter = TokenBucket(rate=1, burst=5)
+    start = time.time()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.time() - start < .1
+
+
+def test_threads_share_limit_and_are_released_in_order():
+    limiter = TokenBucket(rate=20)
+    reservations, releases = [], []
+    lock = threading.Lock()
+    def work(n):
+        wait = limiter.reserve()
+        lock.acquire()
+        reservations.append((wait, n))
+        lock.release()
+        time.sleep(wait)
+        lock.acquire()
+        releases.append(n)
+        lock.release()
+    start = time.time()
+    threads = [threading.Thread(target=work, args=(n, )) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.time() - start >= 7 / 20.0
+    assert releases == [n for _, n in sorted(reservations)]
+
+
+def test_api_instances_can_share_limiter():
+    limiter = TokenBucket(rate=20)
+    api1 = API(locale='de', limiter=limiter)
+    api2 = API(locale='uk', limiter=limiter)
+    start = time.time()
+    for _ in range(3):
+        api1._throttle()
+        api2._throttle()
+    assert time.time() - start >= 5 / 20.0
+
+
+def test_default_limiter_uses_requests_per_second():
+    api = API(locale='de')
+    api.REQUESTS_PER_SECOND = 10000
+    api._throttle()
+    assert api.limiter.rate == 10000
+    assert api.limiter.burst == api.BURST
+
+
+def _acquire_shared(path, rate, times):
+    limiter = SharedTokenBucket(path, rate)
+    for _ in range(times):
+        limiter.acquire()
+    limiter.close()
+
+
+@pytest.mark.skipif('multiprocessing is None')
+def test_shared_bucket_limits_all_processes(tmpdir):
+    path = tmpdir.join('limit').strpath
+    start = time.time()
+    processes = [multiprocessing.Process(target=_acquire_shared,
+                                         args=(path, 20, 3))
+                 for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert time.time() - start >= 8 / 20.0
+
+
+def test_shared_bucket_limits_threads(tmpdir):
+    limiter = SharedTokenBucket(tmpdir.join('limit').strpath, rate=20)
+    start = time.time()
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.time() - start >= 4 / 20.0
+
+
+def pytest_funcarg__throttled_fetch(request):
+    """
+    Replaces ``API._send`` with a function which answers the first
+    ``throttled_fetch.throttle`` requests with ``RequestThrottled`` (HTTP 503)
+    and counts its calls in ``throttled_fetch.calls``.
+    """
+    monkeypatch = request.getfuncargvalue('monkeypatch')
+    throttled = open(os.path.join(XML_TEST_DIR,
+        'APICalls-fails-for-too-many-requests.xml')).read()
+    class counter (object):
+        calls = 0
+        throttle = 0
+    def send(api, url):
+        counter.calls += 1
+        if counter.calls <= counter.throttle:
+            raise urllib2.HTTPError(url, 503, 'Service Unavailable', {},
+                                    StringIO.StringIO(throttled))
+        return StringIO.StringIO(fake_search_response())
+    monkeypatch.setattr(API, '_send', send)
+    return counter
+
+
+def test_adaptive_rate():
+    limiter = AdaptiveTokenBucket(rate=1, min_rate=.5, max_rate=1.2,
+                                  increase=.1, decrease=.5)
+    limiter.success()
+    assert limiter.rate == 1.1
+    limiter.success()
+    limiter.success()
+    assert limiter.rate == 1.2
+    assert limiter.throttled()
+    assert limiter.rate == .6
+    limiter.throttled()
+    assert limiter.rate == .5
+
+
+def test_throttled_requests_are_retried(throttled_fetch):
+    throttled_fetch.throttle = 2
+    limiter = AdaptiveTokenBucket(rate=100, max_rate=100, increase=1)
+    api = API(locale='de', limiter=limiter)
+    api.item_lookup('P1I0')
+    assert throttled_fetch.calls == 3
+    assert limiter.rate == 26
+
+
+def test_cached_responses_do_not_raise_rate(throttled_fetch, tmpdir):
+    limiter = AdaptiveTokenBucket(rate=1, max_rate=100, increase=1)
+    api = ResponseCachingAPI(locale='de', cachedir=tmpdir.strpath,
+                             limiter=limiter)
+    for _ in range(5):
+        api.item_lookup('P1I0')
+    assert throttled_fetch.calls == 1
+    assert limiter.rate == 2
+
+
+def test_throttled_retries_are_limited(throttled_fetch):
+    throttled_fetch.throttle = 10
+    api = API(locale='de', limiter=AdaptiveTokenBucket(rate=1000, min_rate=100))
+    pytest.raises(TooManyRequests, api.item_lookup, 'P1I0')
+    assert throttled_fetch.calls == api.THROTTLED_RETRIES + 1
+
+
+def test_throttled_requests_are_not_retried_by_default(throttled_fetch):
+    throttled_fetch.throttle = 1
+    api = API(locale='de')
+    api.REQUESTS_PER_SECOND = 10000
+    pytest.raises(TooManyRequests, api.item_lookup, 'P1I0')
+    assert throttled_fetch.calls == 1
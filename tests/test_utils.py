@@ -95,4 +95,53 @@ def test_specific_config_file_overrides_all_but_os_variables(configfiles, monkey
 def test_load_class(txt, cls):
     loaded = utils.load_class(txt)
     assert isinstance(loaded, types.TypeType)
-    assert loaded == cls
\ No newline at end of file
+    assert loaded == cls
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = utils.LRUCache(maxsize=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_lru_cache_byte_budget():
+    cache = utils.LRUCache(maxbytes=10)
+    cache['a'] = 'x' * 6
+    cache['b'] = 'x' * 4
+    assert cache.size == 10
+    cache['c'] = 'x' * 3
+    assert 'a' not in cache and cache.size == 7
+    cache['d'] = 'x' * 11  # too large to be cached at all
+    assert 'd' not in cache and len(cache) == 2
+    assert cache.pop('b') == 'xxxx' and cache.size == 3
+
+
+def test_lru_cache_replaced_entries_are_recently_used():
+    cache = utils.LRUCache(maxsize=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache['a'] = 3
+    cache['c'] = 4
+    assert 'b' not in cache
+    assert cache.get('a') == 3
+    cache.clear()
+    assert len(cache) == 0 and cache.get('a') is None
+    cache['d'] = 5
+    assert cache.get('d') == 5
+
+
+def test_closing_iterator_cleans_up_once():
+    cleaned = []
+    iterator = utils.ClosingIterator([1, 2], lambda: cleaned.append(1))
+    assert list(iterator) == [1, 2]
+    iterator.close()
+    assert cleaned == [1]
+    iterator = utils.ClosingIterator([1, 2], lambda: cleaned.append(2))
+    iterator.next()
+    del iterator  # given up half-way
+    assert cleaned == [1, 2]
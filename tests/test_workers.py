@@ -0,0 +1,69 @@
+import threading
+import time
+import pytest
+
+from amazonproduct.workers import WorkerPool, Future
+from amazonproduct.workers import TimeoutError, CancelledError
+
+
+def test_result_is_returned():
+    pool = WorkerPool(2)
+    assert pool.submit(lambda a, b: a + b, 1, b=2).result() == 3
+
+
+def test_exception_is_reraised():
+    pool = WorkerPool(2)
+    future = pool.submit(lambda: 1 / 0)
+    pytest.raises(ZeroDivisionError, future.result)
+    assert isinstance(future.exception(), ZeroDivisionError)
+
+
+def test_calls_run_concurrently():
+    pool = WorkerPool(5)
+    start = time.time()
+    results = list(pool.map(lambda x: time.sleep(.2) or x, range(5)))
+    assert results == range(5)
+    assert time.time() - start < .5
+
+
+def test_number_of_threads_is_bounded():
+    pool = WorkerPool(3)
+    running = []
+    lock = threading.Lock()
+    def work():
+        lock.acquire()
+        running.append(threading.current_thread())
+        lock.release()
+        time.sleep(.05)
+    for future in [pool.submit(work) for _ in range(10)]:
+        future.result()
+    assert len(set(running)) <= 3
+    pool.shutdown()
+
+
+def test_timeout():
+    future = Future()
+    pytest.raises(TimeoutError, future.result, timeout=.01)
+
+
+def test_cancelled_future_is_not_run():
+    pool = WorkerPool(1)
+    event = threading.Event()
+    blocker = pool.submit(event.wait)
+    calls = []
+    future = pool.submit(calls.append, 1)
+    assert future.cancel()
+    event.set()
+    blocker.result()
+    pool.shutdown()
+    assert calls == []
+    pytest.raises(CancelledError, future.result)
+
+
+def test_done_callback():
+    future = Future()
+    done = []
+    future.add_done_callback(done.append)
+    future.set_result(42)
+    future.add_done_callback(done.append)
+    assert done == [future, future]
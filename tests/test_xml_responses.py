@@ -406,6 +406,8 @@ class TestResultPaginator (object):
         paginator = api.item_search('All', Keywords='Michael', paginate=False)
         assert not isinstance(paginator, BaseResultPaginator)
 
+    # related items are hidden inside the items which are streamed
+    @runfor(processors=['objectify', 'etree', 'elementtree'])
     def test_itemlookup_related_items_pagination(self, api):
         paginator = api.item_lookup('B000YEF2OG',
             ResponseGroup='Large,RelatedItems',
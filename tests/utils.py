@@ -64,3 +64,66 @@ def arguments_from_url(url):
         if key in IGNORABLE_ARGUMENTS:
             del params[key]
     return params
+
+
+SEARCH_RESPONSE = """<?xml version="1.0" ?>
+<ItemSearchResponse xmlns="http://webservices.amazon.com/AWSECommerceService/2011-08-01">
+  <OperationRequest>
+    <RequestId>00000000-0000-0000-0000-000000000000</RequestId>
+  </OperationRequest>
+  <Items>
+    <Request>
+      <IsValid>True</IsValid>
+      <ItemSearchRequest>
+        <ItemPage>%(page)i</ItemPage>
+        <SearchIndex>Books</SearchIndex>
+      </ItemSearchRequest>
+    </Request>
+    <TotalResults>%(results)i</TotalResults>
+    <TotalPages>%(pages)i</TotalPages>
+    %(items)s
+  </Items>
+</ItemSearchResponse>"""
+
+def fake_search_response(page=1, pages=1, per_page=10):
+    """
+    Returns a synthetic ItemSearch response for ``page`` of ``pages`` with
+    ``per_page`` items each. The items have ASINs ``P<page>I<item>``.
+    """
+    items = ''.join('<Item><ASIN>P%iI%i</ASIN></Item>' % (page, i)
+                    for i in range(per_page))
+    return SEARCH_RESPONSE % {'page': page, 'pages': pages, 'items': items,
+                              'results': pages * per_page}
+
+LOOKUP_RESPONSE = """<?xml version="1.0" ?>
+<ItemLookupResponse xmlns="http://webservices.amazon.com/AWSECommerceService/2011-08-01">
+  <OperationRequest>
+    <RequestId>00000000-0000-0000-0000-000000000000</RequestId>
+  </OperationRequest>
+  <Items>
+    <Request>
+      <IsValid>True</IsValid>
+      <ItemLookupRequest>
+        <ItemId>%(ids)s</ItemId>
+      </ItemLookupRequest>
+      %(errors)s
+    </Request>
+    %(items)s
+  </Items>
+</ItemLookupResponse>"""
+
+def fake_lookup_response(ids, invalid=lambda id: id.startswith('X')):
+    """
+    Returns a synthetic ItemLookup response for ``ids``. Items for which
+    ``invalid(id)`` is true are reported as errors (as Amazon does).
+    """
+    items = ''.join('<Item><ASIN>%s</ASIN></Item>' % id
+                    for id in ids if not invalid(id))
+    errors = ''.join('<Error><Code>AWS.InvalidParameterValue</Code>'
+                     '<Message>%s is not a valid value for ItemId. Please '
+                     'change this value and retry your request.</Message>'
+                     '</Error>' % id for id in ids if invalid(id))
+    if errors:
+        errors = '<Errors>%s</Errors>' % errors
+    return LOOKUP_RESPONSE % {'ids': ','.join(ids), 'items': items,
+                              'errors': errors}